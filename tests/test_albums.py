@@ -0,0 +1,116 @@
+import os
+import shutil
+import logging
+import tempfile
+import unittest
+from unittest import mock
+from usbackup_gphotos.storage import Storage
+from usbackup_gphotos.settings_model import SettingsModel
+from usbackup_gphotos.media_items_model import MediaItemsModel
+from usbackup_gphotos.albums_model import AlbumsModel
+from usbackup_gphotos.media_items import MediaItems
+from usbackup_gphotos import albums
+from usbackup_gphotos.albums import Albums
+
+class FakeApi:
+    # pages lists the same way the Google Photos API does (nextPageToken)
+    def __init__(self) -> None:
+        self.media_items = {f'r{i}': {
+            'id': f'r{i}',
+            'filename': f'IMG_{i}.jpg',
+            'mimeType': 'image/jpeg',
+            'baseUrl': f'http://localhost/{i}',
+            'mediaMetadata': {'creationTime': '2020-01-01T10:00:00Z'},
+        } for i in range(4)}
+        self.albums = {'a0': ('Album', ['r0', 'r1']), 'a1': ('Trip', ['r2', 'r3'])}
+
+    def media_items_search(self, *, album_id: str = None, page_size: int = 100, page_token: str = None, **kwargs) -> dict:
+        if album_id:
+            media_items = [self.media_items[remote_id] for remote_id in self.albums[album_id][1]]
+        else:
+            media_items = list(self.media_items.values())
+
+        return self._page(media_items, 'mediaItems', page_size, page_token)
+
+    def media_items_batch_get(self, remote_ids: list) -> list:
+        return [{'mediaItem': self.media_items[remote_id]} for remote_id in remote_ids]
+
+    def albums_list(self, *, page_size: int = 50, page_token: str = None) -> dict:
+        albums = [{
+            'id': remote_id,
+            'title': title,
+            'mediaItemsCount': str(len(remote_ids)),
+            'coverPhotoMediaItemId': remote_ids[0],
+        } for remote_id, (title, remote_ids) in self.albums.items()]
+
+        return self._page(albums, 'albums', page_size, page_token)
+
+    def _page(self, items: list, key: str, page_size: int, page_token: str) -> dict:
+        start = int(page_token or 0)
+        page = {key: items[start:start + page_size]}
+
+        if start + page_size < len(items):
+            page['nextPageToken'] = str(start + page_size)
+
+        return page
+
+class AlbumsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self._dest_path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._dest_path)
+
+        logger = logging.getLogger('usbackup_gphotos_test')
+        storage = Storage(':memory:')
+        SettingsModel(storage)
+
+        self._api = FakeApi()
+        self._media_items = MediaItems(self._dest_path, model=MediaItemsModel(storage), google_api=self._api, logger=logger)
+        self._albums = Albums(self._dest_path, model=AlbumsModel(storage), google_api=self._api, media_items=self._media_items, logger=logger)
+
+        self._media_items.index_items()
+
+    def test_index_albums_without_filter(self) -> None:
+        # --album not given (None) or given empty, all albums are indexed
+        for filter_albums in (None, []):
+            with self.subTest(filter_albums=filter_albums):
+                info = self._albums.index_albums(filter_albums=filter_albums)
+
+                self.assertEqual(info['indexed'] + info['skipped'], 2)
+                self.assertEqual(info['failed'], 0)
+
+    def test_index_albums_with_filter(self) -> None:
+        info = self._albums.index_albums(filter_albums=['Trip'])
+
+        self.assertEqual(info['indexed'], 1)
+        self.assertEqual(self._albums.get_album_meta(remote_id='a0'), {})
+
+    def test_delete_obsolete_album_items(self) -> None:
+        self._media_items._download_item = self._download_item
+        self._media_items.sync_items()
+        self._albums.index_albums()
+        self._albums.sync_albums_items(sync_mode='copy')
+
+        album_dir = os.path.join(self._albums.dest_path, 'albums', 'Album')
+        self.assertEqual(sorted(os.listdir(album_dir)), ['IMG_0.jpg', 'IMG_1.jpg'])
+
+        # r1 was removed from the album
+        self._api.albums['a0'] = ('Album', ['r0'])
+        self._albums.index_albums()
+
+        with mock.patch('os.unlink', wraps=os.unlink) as unlink:
+            info = self._albums.delete_obsolete_albums_items()
+
+        self.assertEqual(info['deleted'], 1)
+        self.assertEqual(os.listdir(album_dir), ['IMG_0.jpg'])
+
+        if albums._UNLINK_DIR_FD:
+            # removed relative to the opened album directory
+            unlink.assert_called_once_with('IMG_1.jpg', dir_fd=mock.ANY)
+            self.assertIsInstance(unlink.call_args.kwargs['dir_fd'], int)
+
+    def _download_item(self, url: str, dest_file: str) -> None:
+        with open(dest_file, 'wb') as f:
+            f.write(url.encode())
+
+if __name__ == '__main__':
+    unittest.main()
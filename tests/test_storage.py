@@ -0,0 +1,98 @@
+import unittest
+from usbackup_gphotos import storage
+from usbackup_gphotos.storage import Storage
+from usbackup_gphotos.settings_model import SettingsModel
+from usbackup_gphotos.media_items_model import MediaItemsModel
+from usbackup_gphotos.albums_model import AlbumsModel
+
+class StorageSmokeTest(unittest.TestCase):
+    # same model calls on every available backend, rows and counts must match sqlite3 behavior
+    backends = ['sqlite3', 'apsw']
+
+    def test_models(self) -> None:
+        for backend in self.backends:
+            with self.subTest(backend=backend):
+                if backend == 'apsw' and storage.apsw is None:
+                    self.skipTest('apsw not installed')
+
+                self._run_models(Storage(':memory:', backend=backend))
+
+    def _run_models(self, db: Storage) -> None:
+        settings_model = SettingsModel(db)
+        mi_model = MediaItemsModel(db)
+        a_model = AlbumsModel(db)
+
+        settings_model.update_aseting('token_hash', 'abc')
+        self.assertEqual(settings_model.get_settings(), {'token_hash': 'abc'})
+
+        rows = [self._media_item_row(i) for i in range(3)]
+        self.assertEqual(mi_model.add_media_items_meta_bulk(rows), 3)
+        mi_model.commit()
+
+        items = mi_model.search_media_items_meta(limit=10)
+        self.assertEqual([item['remote_id'] for item in items], ['r0', 'r1', 'r2'])
+        self.assertIsInstance(items[0], dict)
+
+        media_ids = [item['media_id'] for item in items]
+        updates = [{'media_id': media_id, 'status': 'synced'} for media_id in media_ids[:2]]
+        self.assertEqual(mi_model.update_media_items_meta_bulk(updates), 2)
+        self.assertEqual(mi_model.get_media_items_meta_stats(), {'pending_sync': 1, 'synced': 2})
+        self.assertEqual(mi_model.get_media_items_cnames(path='items/2020/01'), {'IMG_0.jpg', 'IMG_1.jpg', 'IMG_2.jpg'})
+
+        # rollback discards writes of the open transaction
+        db.begin()
+        mi_model.delete_media_item_meta(media_ids[0])
+        mi_model.rollback()
+        self.assertEqual(mi_model.get_media_items_meta_cnt(), 3)
+
+        # a failed savepoint undoes only its own writes
+        db.begin()
+        mi_model.delete_media_item_meta(media_ids[0])
+
+        with self.assertRaises(ValueError):
+            with db.savepoint('test'):
+                mi_model.delete_media_item_meta(media_ids[1])
+                raise ValueError('failed')
+
+        mi_model.commit()
+        media_ids = media_ids[1:]
+        self.assertEqual([item['media_id'] for item in mi_model.search_media_items_meta(limit=10)], media_ids)
+
+        album_meta = a_model.add_album_meta(
+            remote_id='a0',
+            name='Album',
+            cname='Album',
+            size=2,
+            cover_photo_id='x',
+            path='albums',
+            index_date='2020-01-01 00:00:00',
+            last_checked='2020-01-01 00:00:00',
+            status='indexed',
+        )
+        self.assertEqual(album_meta['remote_id'], 'a0')
+
+        rows = [{'album_id': album_meta['album_id'], 'media_id': media_id, 'status': 'pending_sync'} for media_id in media_ids[:2]]
+        self.assertEqual(a_model.add_albums_items_meta_bulk(rows), 2)
+        self.assertEqual(a_model.get_albums_items_cnt_by_album([album_meta['album_id']]), {album_meta['album_id']: 2})
+        self.assertEqual(a_model.set_albums_items_meta_stale(album_id=album_meta['album_id']), 2)
+        a_model.commit()
+
+        albums_meta = a_model.get_albums_meta_with_items_cnt(remote_ids=['a0'])
+        self.assertEqual(albums_meta['a0']['items_cnt'], 0)
+
+    def _media_item_row(self, i: int) -> dict:
+        return {
+            'remote_id': f'r{i}',
+            'name': f'IMG_{i}.jpg',
+            'cname': f'IMG_{i}.jpg',
+            'mime_type': 'image/jpeg',
+            'create_date': '2020-01-01 00:00:00',
+            'modify_date': '2020-01-01 00:00:00',
+            'path': 'items/2020/01',
+            'index_date': '2020-01-01 00:00:00',
+            'last_checked': '2020-01-01 00:00:00',
+            'status': 'pending_sync',
+        }
+
+if __name__ == '__main__':
+    unittest.main()
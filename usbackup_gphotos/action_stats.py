@@ -1,4 +1,6 @@
 class ActionStats:
+    __slots__ = ('_props', '_total')
+
     def __init__(self, **props) -> None:
         self._props: dict = props
         self._total: int = sum(props.values())
@@ -10,8 +12,18 @@ class ActionStats:
     def increment(self, **props) -> None:
         for prop, value in props.items():
             self._props[prop] += value
+            self._total += value
+
+    def add(self, prop: str, value: int = 1) -> None:
+        # same as increment, without building a kwargs dict (for per item loops)
+        self._props[prop] += value
+        self._total += value
+
+    def merge(self, other: 'ActionStats') -> None:
+        for prop, value in other._props.items():
+            self._props[prop] += value
 
-        self._total += sum(props.values())
+        self._total += other.total
 
     def __str__(self) -> str:
         return f'{", ".join(f"{k}: {v}" for k, v in self._props.items())}'
@@ -2,15 +2,21 @@ import os
 import logging
 import asyncio
 import shutil
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from usbackup_gphotos.albums_model import AlbumsModel
 from usbackup_gphotos.media_items import MediaItems
 from usbackup_gphotos.gphotos_api import GPhotosApi
 from usbackup_gphotos.action_stats import ActionStats
-from usbackup_gphotos.utils import transform_fs_safe, gen_batch_stats
+from usbackup_gphotos.utils import transform_fs_safe, gen_batch_stats, paginate, format_now, process_queued
 
 __all__ = ['Albums']
 
+# album item files can be removed relative to an opened album directory (os.remove is not listed, check os.unlink)
+_UNLINK_DIR_FD = os.unlink in os.supports_dir_fd
+
 class Albums:
     def __init__(self, dest_path: str, *, model: AlbumsModel, google_api: GPhotosApi, media_items: MediaItems, logger: logging.Logger) -> None:
         self._dest_path: str = dest_path
@@ -22,130 +28,49 @@ class Albums:
 
         self._album_list_limit: int = 50
         self._album_items_list_limit: int = 100
+        # number of albums whose items are fetched from the api at the same time
+        self._album_index_concurrency: int = 5
+        # pages of album items fetched ahead of indexing (per album), so large albums are not held in memory
+        self._album_items_prefetch_pages: int = 2
+        # number of album item files removed at the same time
+        self._delete_concurrency: int = 10
 
         self._albums_dir = 'albums'
         self._sync_modes = ['symlink', 'hardlink', 'copy']
 
+        # album meta lookups by album_id, valid for the duration of an action
+        self._albums_meta_cache: dict = {}
+        # taken album cnames by path, valid for the duration of an action
+        self._albums_cnames: dict = {}
+        # album directories already created during an album items sync
+        self._ensured_dirs: set = set()
+        # album directories by (path, cname), so they're not re-joined for every item
+        self._albums_dirs: dict = {}
+        # media items directories relative to album directories by (album dir, item path), used as base for symlinks
+        self._items_dirs_relative: dict = {}
+        # file names of media items directories. scoped to a single album items sync (cleared when it starts),
+        # media items are downloaded before and not changed while album items are linked
+        self._dirs_files: dict = {}
+        # guards the caches filled by album items sync threads (_ensured_dirs, _dirs_files)
+        self._fs_cache_lock: threading.Lock = threading.Lock()
+
     @property
     def dest_path(self) -> str:
         return self._dest_path
 
     def index_albums(self, *, last_index: str = None, rescan: bool = False, filter_albums: list = []) -> ActionStats:
-        page_token = None
-        limit = self._album_list_limit
-        check_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        info = ActionStats(indexed=0, skipped=0, failed=0)
-
-        # TODO: list albums by mdate greater than last_index (if it will be available in API)
-
-        # always rescan for now
-        rescan = True
-
-        while True:
-            to_index = self._google_api.albums_list(page_token=page_token, page_size=limit)
-
-            if not to_index:
-                break
-
-            albums = to_index.get('albums', [])
-            page_token = to_index.get('nextPageToken')
-
-            for album in albums:
-                try:
-                    status = self.index_album(album, filter_albums, commit=False)
-                except Exception as e:
-                    self._logger.error(f'Index for album "{album["title"]}" failed. {e}')
-                    info.increment(failed=1)
-                else:
-                    if status == 'indexed':
-                        info.increment(indexed=1)
-                    else:
-                        info.increment(skipped=1)
-
-            self._model.commit()
-
-            if not page_token:
-                break
-
-        if rescan and not filter_albums:
-            # mark all albums older than check_date as stale
-            stale_cnt = self._model.set_albums_meta_stale(last_checked=check_date)
-            self._propagate_stale_albums()
-
-            if stale_cnt:
-                self._logger.info(f'Marked {stale_cnt} albums as stale')
-
-        return info
+        return asyncio.run(self._index_albums(last_index=last_index, rescan=rescan, filter_albums=filter_albums))
     
     def index_album(self, album: dict, filter_albums: list = None, *, commit=True) -> str:
-        album_meta = self._model.get_album_meta(remote_id=album['id'])
-
-        if filter_albums and album['title'] not in filter_albums:
-            self._logger.debug(f'Index for album "{album["title"]}" skipped. Filtered out')
-            return 'skipped'
-
-        # check if album was renamed
-        if album_meta and album_meta['name'] != album['title']:
-            self._logger.info(f'Queueing album "{album_meta["name"]}" for rename to "{album["title"]}"')
-            self._model.update_album_meta(album_meta['album_id'], rename=album['title'])
-
-        if not self._index_needed(album_meta, album):
-            last_checked = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self._model.update_album_meta(album_meta['album_id'], last_checked=last_checked)
-
-            self._logger.debug(f'Index for album "{album_meta["name"]}" skipped. Up to date')
-
-            return 'skipped'
-        
-        self._add_album(album)
-
-        if commit:
-            self._model.commit()
-
-        # retrieve album meta again in case it wasn't created initially
-        album_meta = self._model.get_album_meta(remote_id=album['id'])
-
-        try:
-            self.index_album_items(album_meta['album_id'], commit=commit)
-        except Exception as e:
-            self._model.update_album_meta(album_meta['album_id'], status='index_error')
-
-            raise e from None
-
-        return 'indexed'
+        return asyncio.run(self._index_album(album, filter_albums, commit=commit))
 
     def index_album_items(self, album_id: int, *, commit=True) -> ActionStats:
-        album_meta = self._model.get_album_meta(album_id=album_id)
-        page_token = None
-        limit = self._album_items_list_limit
-        info = ActionStats(indexed=0, failed=0)
-
-        self._model.set_albums_items_meta_stale(album_id=album_meta['album_id'])
-
-        while True:
-            to_index = self._google_api.media_items_search(album_id=album_meta['remote_id'], page_token=page_token, page_size=limit)
-
-            if not to_index:
-                break
-
-            media_items = to_index.get('mediaItems', [])
-            page_token = to_index.get('nextPageToken')
-
-            for media_item in media_items:
-                self._add_album_item(album_meta, media_item)
-                info.increment(indexed=1)
-
-            self._logger.info(f'Album items batch index: indexed {len(to_index.get("mediaItems", []))}')
-
-            if commit:
-                self._model.commit()
-
-            if not page_token:
-                break
-
-        return info
+        return asyncio.run(self._index_album_items(album_id, commit=commit))
     
     def sync_albums(self) -> ActionStats:
+        self._albums_meta_cache.clear()
+        self._albums_cnames.clear()
+
         # rename albums
         self._rename_albums()
 
@@ -160,35 +85,53 @@ class Albums:
     
     def delete_obsolete_albums(self) -> ActionStats:
         limit = 100
-        offset = 0
+        last_id = 0
         total = self._model.get_albums_meta_cnt(status='stale')
         info = ActionStats(deleted=0, failed=0)
 
+        self._albums_meta_cache.clear()
+        self._albums_cnames.clear()
+
         if not total:
             return info
 
-        while True:
-            to_delete = self._model.search_albums_meta(limit=limit, offset=offset, status='stale')
+        # directories of a page are removed in parallel (each rmdir may be a round trip on network filesystems)
+        with ThreadPoolExecutor(max_workers=self._delete_concurrency) as executor:
+            while True:
+                to_delete = self._model.search_albums_meta(limit=limit, after_id=last_id, status='stale')
 
-            if not to_delete:
-                break
+                if not to_delete:
+                    break
 
-            for album_meta in to_delete:
-                if self._model.get_albums_items_meta_cnt(album_id=album_meta['album_id']):
-                    raise ValueError(f'Deletion for album "{album_meta["name"]}" failed. Album is not empty. Make sure to delete album items first')
-                
-                try:                    
-                    self._delete_album_dir(album_meta)
-                    self._model.delete_album_meta(album_meta['album_id'])
-                except Exception as e:
-                    self._logger.error(f'Deletion for album "{album_meta["name"]}" failed. Reason: {e}')
+                last_id = to_delete[-1]['album_id']
 
-                    offset += 1
-                    info.increment(failed=1)
-                else:
-                    info.increment(deleted=1)
+                self._model.begin()
 
-            self._model.commit()
+                try:
+                    # count remaining items of all albums in the page at once
+                    albums_items_cnt = self._model.get_albums_items_cnt_by_album([album_meta['album_id'] for album_meta in to_delete])
+                    deleted = []
+
+                    for album_meta in to_delete:
+                        if albums_items_cnt.get(album_meta['album_id']):
+                            raise ValueError(f'Deletion for album "{album_meta["name"]}" failed. Album is not empty. Make sure to delete album items first')
+
+                    for (album_meta, error) in zip(to_delete, executor.map(self._delete_obsolete_album, to_delete)):
+                        if error:
+                            self._logger.error(f'Deletion for album "{album_meta["name"]}" failed. Reason: {error}')
+
+                            info.increment(failed=1)
+                        else:
+                            deleted.append(album_meta['album_id'])
+
+                    # delete meta of all removed albums at once
+                    self._model.delete_albums_meta(deleted)
+                    info.increment(deleted=len(deleted))
+
+                    self._model.commit()
+                except Exception:
+                    self._model.rollback()
+                    raise
 
         return info
 
@@ -196,10 +139,10 @@ class Albums:
         info = ActionStats(deleted=0, failed=0)
 
         db_info = self._delete_obsolete_albums_items_by_db()
-        info.increment(**dict(db_info))
+        info.merge(db_info)
 
         fs_info = self._delete_obsolete_albums_items_by_fs()
-        info.increment(**dict(fs_info))
+        info.merge(fs_info)
 
         return info
 
@@ -214,7 +157,7 @@ class Albums:
     
     def scan_synced_albums_items_fs(self) -> ActionStats:
         limit = 100
-        offset = 0
+        last_id = 0
         total = self._model.get_albums_items_meta_cnt(status='synced')
         info = ActionStats(fixed=0)
 
@@ -222,11 +165,15 @@ class Albums:
             return info
         
         while True:
-            to_check = self._model.search_albums_items_meta(limit=limit, offset=offset, status='synced')
+            to_check = self._model.search_albums_items_meta(limit=limit, after_id=last_id, status='synced')
 
             if not to_check:
                 break
 
+            last_id = to_check[-1]['album_item_id']
+
+            updates = []
+
             for album_item_meta in to_check:
                 if not album_item_meta['item_cname'] or not album_item_meta['album_cname']:
                     # if item_cname or album_cname is missing, most likely we have an item that exists in an album, but missing in media_items
@@ -236,16 +183,30 @@ class Albums:
                 else:
                     if not self._album_item_exists_fs(album_item_meta):
                         self._logger.debug(f'Media item "{album_item_meta["item_name"]}" not found on filesystem. Setting status to pending_sync')
-                        self._model.update_album_item_meta(album_item_meta['album_item_id'], status='pending_sync')
+                        updates.append({'album_item_id': album_item_meta['album_item_id'], 'status': 'pending_sync'})
 
                         info.increment(fixed=1)
 
+            # update all missing items of the page at once
+            self._model.update_albums_items_meta_bulk(updates)
             self._model.commit()
 
-            offset += limit
-
         return info
     
+    def _get_album_dir(self, album_path: str, album_cname: str) -> str:
+        key = (album_path, album_cname)
+
+        if key not in self._albums_dirs:
+            self._albums_dirs[key] = os.path.join(self._dest_path, album_path, album_cname)
+
+        return self._albums_dirs[key]
+
+    def _get_album_meta_cached(self, album_id: int) -> dict:
+        if album_id not in self._albums_meta_cache:
+            self._albums_meta_cache[album_id] = self._model.get_album_meta(album_id=album_id)
+
+        return self._albums_meta_cache[album_id]
+
     def _get_canonicalized_name(self, album_name: str, path: str) -> str:
         unique = 1
 
@@ -254,81 +215,73 @@ class Albums:
 
         album_name = transform_fs_safe(album_name)
 
-        while True:
-            if not self._model.search_albums_meta(cname=album_name, path=path):
-                return album_name
+        # fetch all taken names of the path once per action, then find the first free suffix locally
+        if path not in self._albums_cnames:
+            self._albums_cnames[path] = self._model.get_albums_cnames(path=path)
+
+        cnames = self._albums_cnames[path]
 
+        while album_name in cnames:
             name, ext = os.path.splitext(album_name)
 
             album_name = f'{name} ({unique}){ext}'
 
             unique += 1
 
+        cnames.add(album_name)
+
+        return album_name
+
+    def _delete_obsolete_album(self, album_meta: dict) -> Exception:
+        try:
+            self._delete_album_dir(album_meta)
+        except Exception as e:
+            return e
+
+        return None
+
     def _delete_album_dir(self, album_meta: dict) -> None:
         dest_dir = os.path.join(self._dest_path, album_meta['path'], album_meta['cname'])
 
         self._logger.info(f'Deleting album "{album_meta["name"]}"')
 
-        if os.path.isdir(dest_dir):
+        try:
             os.rmdir(dest_dir)
-        else:
+        except FileNotFoundError:
             self._logger.debug(f'Deletion for album "{album_meta["name"]}" skipped. Directory not found')
 
-    def _delete_album_item_file(self, album_item_meta: dict) -> None:
+    def _delete_album_item_file(self, album_item_meta: dict, dir_fd: int = None) -> None:
         if not album_item_meta['item_cname'] or not album_item_meta['album_cname']:
             raise ValueError(f'Missing meta for album item #{album_item_meta["album_item_id"]}')
-        
-        dest_file = os.path.join(
-            self._dest_path,
-            album_item_meta['album_path'],
-            album_item_meta['album_cname'],
-            album_item_meta['item_cname']
-        )
 
         self._logger.debug(f'Deleting album item "{album_item_meta["item_name"]}" ("{album_item_meta["album_name"]}")')
 
-        if os.path.isfile(dest_file):
-            os.remove(dest_file)
-        else:
+        # remove directly instead of checking existence first (saves a stat per file)
+        try:
+            if dir_fd is not None:
+                # relative to the already opened album directory (no full path lookup)
+                os.unlink(album_item_meta['item_cname'], dir_fd=dir_fd)
+            else:
+                os.remove(os.path.join(self._get_album_dir(album_item_meta['album_path'], album_item_meta['album_cname']), album_item_meta['item_cname']))
+        except FileNotFoundError:
             self._logger.debug(f'Deletion for album item "{album_item_meta["item_name"]}" ("{album_item_meta["album_name"]}") skipped. File not found')
 
     def _album_item_exists_fs(self, album_item_meta: dict) -> bool:
         if not album_item_meta['item_cname'] or not album_item_meta['album_cname']:
             raise ValueError(f'Missing meta for album item #{album_item_meta["album_item_id"]}')
         
-        dest_file = os.path.join(
-            self._dest_path,
-            album_item_meta['album_path'],
-            album_item_meta['album_cname'],
-            album_item_meta['item_cname']
-        )
+        dest_file = os.path.join(self._get_album_dir(album_item_meta['album_path'], album_item_meta['album_cname']), album_item_meta['item_cname'])
 
         return os.path.isfile(dest_file)
     
-    def _propagate_stale_albums(self) -> None:
-        limit = 100
-        offset = 0
-        total = self._model.get_albums_meta_cnt(status='stale')
-
-        if not total:
-            return
-        
-        while True:
-            to_propagate = self._model.search_albums_meta(limit=limit, offset=offset, status='stale')
-
-            if not to_propagate:
-                break
-
-            for album_meta in to_propagate:
-                self._model.set_albums_items_meta_stale(album_id=album_meta['album_id'])
-
-            offset += limit
-    
     def _index_needed(self, album_meta: dict, album: dict) -> bool:
         if not album_meta:
             return True
         
-        album_items_cnt = self._model.get_albums_items_meta_cnt(album_id=album_meta['album_id'], status=('not', ['stale']))
+        if 'items_cnt' in album_meta:
+            album_items_cnt = album_meta['items_cnt']
+        else:
+            album_items_cnt = self._model.get_albums_items_meta_cnt(album_id=album_meta['album_id'], status=('not', ['stale']))
         
         synced = album_meta['status'] in ['indexed']
         same_size = int(album_meta['size']) == int(album['mediaItemsCount']) == album_items_cnt
@@ -340,10 +293,11 @@ class Albums:
         
         return False
 
-    def _add_album(self, album: dict) -> int:
+    def _add_album(self, album: dict, album_meta: dict = None) -> dict:
         path = self._albums_dir
-        cname = self._get_canonicalized_name(album['title'], path)
-        index_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        # cname of existing albums is kept (changes are handled by rename)
+        cname = album_meta['cname'] if album_meta else self._get_canonicalized_name(album['title'], path)
+        index_date = format_now()
 
         self._logger.info(f'Indexing album "{album["title"]}" with {album["mediaItemsCount"]} items')
 
@@ -359,91 +313,286 @@ class Albums:
             status='indexed',
         )
 
-    def _add_album_item(self, album_meta: dict, media_item: dict) -> int:
-        # make sure album item is indexed
-        self._media_items.index_item(media_item)
+    def _index_album_item(self, album_meta: dict, media_item: dict, media_id: int) -> dict:
+        self._logger.debug(f'Indexing album item "{media_item["filename"]}"')
 
-        media_item_meta = self._media_items.get_item_meta(remote_id=media_item['id'])
+        return {
+            'album_id': album_meta['album_id'],
+            'media_id': media_id,
+            'status': 'pending_sync',
+        }
 
-        self._logger.debug(f'Indexing album item "{media_item["filename"]}"')
+    async def _index_albums(self, *, last_index: str = None, rescan: bool = False, filter_albums: list = []) -> ActionStats:
+        limit = self._album_list_limit
+        check_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        info = ActionStats(indexed=0, skipped=0, failed=0)
 
-        return self._model.add_album_item_meta(
-            album_id=album_meta['album_id'],
-            media_item_id=media_item_meta['media_id'],
-            status='pending_sync',
-        )
+        self._albums_meta_cache.clear()
+        self._albums_cnames.clear()
+
+        # titles are looked up for every album
+        filter_albums = frozenset(filter_albums or ())
+
+        semaphore = asyncio.Semaphore(self._album_index_concurrency)
+
+        # TODO: list albums by mdate greater than last_index (if it will be available in API)
+
+        # always rescan for now
+        rescan = True
+
+        async for albums in paginate(self._google_api.albums_list, 'albums', page_size=limit):
+            self._model.begin()
+
+            try:
+                await self._index_albums_page(albums, filter_albums, semaphore, info)
+
+                self._model.commit()
+            except Exception:
+                self._model.rollback()
+                raise
+
+        if rescan and not filter_albums:
+            # mark all albums older than check_date as stale
+            stale_cnt = self._model.set_albums_meta_stale(last_checked=check_date)
+            # mark items of stale albums as stale too
+            self._model.set_albums_items_meta_stale_by_album_status('stale')
+
+            if stale_cnt:
+                self._logger.info(f'Marked {stale_cnt} albums as stale')
+
+        return info
+
+    async def _index_albums_page(self, albums: list, filter_albums: frozenset, semaphore: asyncio.Semaphore, info: ActionStats) -> None:
+        # fetch meta and items count for all albums of the page at once
+        albums_meta = self._model.get_albums_meta_with_items_cnt(remote_ids=[album['id'] for album in albums])
+
+        # start fetching items of all albums that need indexing. api calls of different albums overlap,
+        # while db writes stay on this coroutine (one album at a time)
+        fetches = {}
+
+        for album in albums:
+            if filter_albums and album['title'] not in filter_albums:
+                continue
+
+            if self._index_needed(albums_meta.get(album['id'], {}), album):
+                fetches[album['id']] = self._start_album_items_fetch(album['id'], semaphore)
+
+        checked_ids = []
+
+        try:
+            for album in albums:
+                (fetch, pages) = fetches.get(album['id'], (None, None))
+
+                try:
+                    status = await self._index_album(album, filter_albums, commit=False, album_meta=albums_meta.get(album['id'], {}), pages=pages, checked_ids=checked_ids)
+                except Exception as e:
+                    self._logger.error(f'Index for album "{album["title"]}" failed. {e}')
+                    info.increment(failed=1)
+                else:
+                    if status == 'indexed':
+                        info.increment(indexed=1)
+                    else:
+                        info.increment(skipped=1)
+                finally:
+                    # a fetch left waiting on a full queue would hold its semaphore slot
+                    if fetch:
+                        fetch.cancel()
+        finally:
+            for (fetch, _) in fetches.values():
+                fetch.cancel()
+
+            await asyncio.gather(*[fetch for (fetch, _) in fetches.values()], return_exceptions=True)
+
+        self._model.update_albums_last_checked(checked_ids, format_now())
+
+    async def _index_album(self, album: dict, filter_albums: list = None, *, commit=True, album_meta: dict = None, pages: asyncio.Queue = None, checked_ids: list = None) -> str:
+        if album_meta is None:
+            # meta and items count with a single query
+            album_meta = self._model.get_albums_meta_with_items_cnt(remote_ids=[album['id']]).get(album['id'], {})
+
+        if filter_albums and album['title'] not in filter_albums:
+            self._logger.debug(f'Index for album "{album["title"]}" skipped. Filtered out')
+            return 'skipped'
+
+        # check if album was renamed
+        if album_meta and album_meta['name'] != album['title']:
+            self._logger.info(f'Queueing album "{album_meta["name"]}" for rename to "{album["title"]}"')
+            self._model.update_album_meta(album_meta['album_id'], rename=album['title'])
+
+        if not self._index_needed(album_meta, album):
+            if checked_ids is not None:
+                # caller updates last_checked of all up to date albums at once
+                checked_ids.append(album_meta['album_id'])
+            else:
+                last_checked = format_now()
+                self._model.update_album_meta(album_meta['album_id'], last_checked=last_checked)
+
+            self._logger.debug(f'Index for album "{album_meta["name"]}" skipped. Up to date')
+
+            return 'skipped'
+        
+        album_meta = self._add_album(album, album_meta)
+
+        if commit:
+            self._model.commit()
+
+        self._albums_meta_cache[album_meta['album_id']] = album_meta
+
+        try:
+            await self._index_album_items(album_meta['album_id'], commit=commit, pages=pages)
+        except Exception as e:
+            # album items writes were already undone, only the error status is kept
+            self._model.update_album_meta(album_meta['album_id'], status='index_error')
+
+            if commit:
+                self._model.commit()
+
+            raise e from None
+
+        return 'indexed'
+
+    async def _index_album_items(self, album_id: int, *, commit=True, pages: asyncio.Queue = None) -> ActionStats:
+        album_meta = self._get_album_meta_cached(album_id)
+        info = ActionStats(indexed=0, failed=0)
+        fetch = None
+
+        if pages is None:
+            (fetch, pages) = self._start_album_items_fetch(album_meta['remote_id'], asyncio.Semaphore(1))
+
+        # index the whole album in one transaction
+        self._model.begin()
+
+        try:
+            # if indexing fails, none of the album items writes are kept (other writes of the transaction are)
+            with self._model.savepoint('album_items'):
+                self._model.set_albums_items_meta_stale(album_id=album_meta['album_id'])
+
+                while True:
+                    media_items = await pages.get()
+
+                    # end of album, or the error the fetch failed with
+                    if media_items is None:
+                        break
+
+                    if isinstance(media_items, Exception):
+                        raise media_items
+
+                    # make sure all media items of the page are indexed, then insert album items at once
+                    media_ids = self._media_items.index_items_bulk(media_items)
+                    rows = [self._index_album_item(album_meta, media_item, media_ids[media_item['id']]) for media_item in media_items]
+                    self._model.add_albums_items_meta_bulk(rows)
+
+                    info.increment(indexed=len(rows))
+
+                    self._logger.info(f'Album items batch index: indexed {len(rows)}')
+        finally:
+            if fetch:
+                fetch.cancel()
+
+                await asyncio.gather(fetch, return_exceptions=True)
+
+        if commit:
+            self._model.commit()
+
+        return info
+
+    def _start_album_items_fetch(self, remote_id: str, semaphore: asyncio.Semaphore) -> tuple:
+        # album items pages are fetched in background into a bounded queue, so only a few pages of an album are held in memory
+        pages = asyncio.Queue(maxsize=self._album_items_prefetch_pages)
+        fetch = asyncio.create_task(self._fetch_album_items(remote_id, semaphore, pages))
+
+        return (fetch, pages)
+
+    async def _fetch_album_items(self, remote_id: str, semaphore: asyncio.Semaphore, pages: asyncio.Queue) -> None:
+        try:
+            async with semaphore:
+                async for media_items in paginate(self._google_api.media_items_search, 'mediaItems', album_id=remote_id, page_size=self._album_items_list_limit):
+                    await pages.put(media_items)
+        except Exception as e:
+            # handed to the consumer, so it fails the album instead of waiting for more pages
+            await pages.put(e)
+        else:
+            await pages.put(None)
 
     async def _sync_albums_items(self, *, concurrency: int = 1, sync_mode: str = 'symlink') -> ActionStats:
         limit = 100
-        offset = 0
         opts = {'sync_mode': sync_mode, }
         total = self._model.get_albums_items_meta_cnt(status=['pending_sync', 'sync_error'])
         info = ActionStats(synced=0, skipped=0, failed=0)
 
+        # album dirs may have been renamed or removed and media items downloaded since the last sync
+        self._ensured_dirs.clear()
+        self._dirs_files.clear()
+
         if not total:
             return info
 
-        processed = 0
         t_start = datetime.now()
 
-        while True:
-            to_sync = self._model.search_albums_items_meta(limit=limit, offset=offset, status=['pending_sync', 'sync_error'])
+        def save_results(results: list) -> None:
+            info.merge(self._save_album_items_sync_results(results))
 
-            if not to_sync:
-                break
+            # progress of completed items only
+            (percentage, eta) = gen_batch_stats(t_start, datetime.now(), info.total, total)
 
-            # break items into chunks of concurrency length
-            chunks_to_sync = [to_sync[i:i + concurrency] for i in range(0, len(to_sync), concurrency)]
+            self._logger.info(f'Albums items batch sync: {percentage}, eta: {eta}')
 
-            # sync album items in chunks concurrently
-            for chunk in chunks_to_sync:
-                c_info = await self._sync_album_items_concurrently(chunk, **opts)
+        # filesystem calls run in an executor sized so every worker gets a thread (the default one is capped at cpu count + 4 threads)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            sync_fn = functools.partial(self._sync_album_item, executor=executor, **opts)
 
-                offset += c_info['failed']
-                info.increment(**dict(c_info))
+            await process_queued(self._iter_albums_items_to_sync(limit), sync_fn, save_results, concurrency=concurrency)
 
-            self._model.commit()
+        return info
 
-            t_end = datetime.now()
-            processed += len(to_sync)
-            
-            (percentage, eta) = gen_batch_stats(t_start, t_end, processed, total)
+    async def _iter_albums_items_to_sync(self, limit: int):
+        last_id = 0
 
-            self._logger.info(f'Albums items batch sync: {percentage}, eta: {eta}')
+        while True:
+            to_sync = self._model.search_albums_items_meta(limit=limit, after_id=last_id, status=['pending_sync', 'sync_error'])
 
-        return info
+            if not to_sync:
+                break
+
+            last_id = to_sync[-1]['album_item_id']
+
+            yield to_sync
     
-    async def _sync_album_items_concurrently(self, to_sync: list, **opts) -> ActionStats:
-        tasks = []
+    def _save_album_items_sync_results(self, results: list) -> ActionStats:
         info = ActionStats(synced=0, skipped=0, failed=0)
+        updates = []
 
-        for album_item_meta in to_sync:
-            # sync album item
-            tasks.append(asyncio.create_task(self._sync_album_item(album_item_meta, **opts), name=album_item_meta['album_item_id']))
-
-        await asyncio.gather(*tasks, return_exceptions=True)
+        # update items status based on workers results
+        for (album_item_meta, status, error) in results:
+            album_item_id = album_item_meta['album_item_id']
 
-        # update items status based on async tasks results
-        for t in tasks:
-            if t.exception():
-                self._logger.error(f'Sync for album item #{t.get_name()} failed. Reason {t.exception()}')
-                self._model.update_album_item_meta(t.get_name(), status='sync_error')
+            if error:
+                self._logger.error(f'Sync for album item #{album_item_id} failed. Reason {error}')
+                updates.append({'album_item_id': album_item_id, 'status': 'sync_error'})
 
-                info.increment(failed=1)
+                info.add('failed')
             else:
-                status = t.result()
                 status_upd = 'synced' if status in ['synced', 'skipped'] else status
 
-                self._model.update_album_item_meta(t.get_name(), status=status_upd)
+                updates.append({'album_item_id': album_item_id, 'status': status_upd})
 
                 if status == 'synced':
-                    info.increment(synced=1)
+                    info.add('synced')
                 else:
-                    info.increment(skipped=1)
+                    info.add('skipped')
+
+        self._model.begin()
+
+        try:
+            self._model.update_albums_items_meta_bulk(updates)
+            self._model.commit()
+        except Exception:
+            self._model.rollback()
+            raise
 
         return info
 
-    async def _sync_album_item(self, album_item_meta: dict, *, sync_mode: str = 'symlink') -> str:
+    async def _sync_album_item(self, album_item_meta: dict, *, sync_mode: str = 'symlink', executor: ThreadPoolExecutor = None) -> str:
         if not album_item_meta['item_cname'] or not album_item_meta['album_cname']:
             raise ValueError(f'Missing meta for album item #{album_item_meta["album_item_id"]}')
         
@@ -458,53 +607,153 @@ class Albums:
             return 'ignored'
         
         src_file = os.path.join(self._media_items.dest_path, album_item_meta['item_path'], album_item_meta['item_cname'])
-        dest_path = os.path.join(self._dest_path, album_item_meta['album_path'], album_item_meta['album_cname'])
+        dest_path = self._get_album_dir(album_item_meta['album_path'], album_item_meta['album_cname'])
         dest_file = os.path.join(dest_path, album_item_meta['item_cname'])
+        src_file_relative = None
 
-        if not os.path.isfile(src_file):
-            raise ValueError(f'missing source file')
+        if sync_mode == 'symlink':
+            # relative dir is computed once per album dir and items dir, only the file name is joined for every item
+            key = (dest_path, album_item_meta['item_path'])
 
-        # if file already exists, skip
-        if os.path.isfile(dest_file):
-            self._logger.debug(f'Sync for album item "{album_item_meta["item_name"]}" ("{album_item_meta["album_name"]}") skipped. Item already exists')
-            return 'skipped'
+            if key not in self._items_dirs_relative:
+                self._items_dirs_relative[key] = os.path.join(os.path.relpath(self._media_items.dest_path, dest_path), album_item_meta['item_path'])
+
+            src_file_relative = os.path.join(self._items_dirs_relative[key], album_item_meta['item_cname'])
+
+        # run blocking filesystem calls in a thread so items are linked in parallel
+        link_fn = functools.partial(self._link_album_item, album_item_meta, src_file, src_file_relative, dest_path, dest_file, sync_mode)
+
+        return await asyncio.get_running_loop().run_in_executor(executor, link_fn)
+
+    def _link_album_item(self, album_item_meta: dict, src_file: str, src_file_relative: str, dest_path: str, dest_file: str, sync_mode: str) -> str:
+        # symlinks to a missing file would be created anyway, so check the source explicitly.
+        # hardlink and copy fail on their own if source is missing
+        if sync_mode == 'symlink' and not self._dir_has_file(os.path.dirname(src_file), album_item_meta['item_cname']):
+            raise ValueError(f'missing source file')
 
         self._logger.debug(f'Linking album item "{album_item_meta["item_name"]}" ("{album_item_meta["album_name"]}")')
 
-        if not os.path.isdir(dest_path):
-            os.makedirs(dest_path)
+        if dest_path not in self._ensured_dirs:
+            # created outside the lock, concurrent calls for the same dir are harmless (exist_ok)
+            os.makedirs(dest_path, exist_ok=True)
 
-        if sync_mode == 'symlink':
-            src_file_relative = os.path.relpath(src_file, dest_path)
-
-            # create symbolic link
-            os.symlink(src_file_relative, dest_file)
-        elif sync_mode == 'hardlink':
-            # use hard links
-            os.link(src_file, dest_file)
-        elif sync_mode == 'copy':
-            # copy file
-            # use copy2 to preserve file metadata
-            shutil.copy2(src_file, dest_file)
+            with self._fs_cache_lock:
+                self._ensured_dirs.add(dest_path)
+
+        try:
+            if sync_mode == 'symlink':
+                # create symbolic link
+                os.symlink(src_file_relative, dest_file)
+            elif sync_mode == 'hardlink':
+                # use hard links
+                os.link(src_file, dest_file)
+            elif sync_mode == 'copy':
+                # copy file
+                self._copy_album_item(src_file, dest_file)
+        except FileExistsError:
+            # skip only if a file is already there. dangling links, directories etc. are reported as errors
+            if not os.path.isfile(dest_file):
+                raise
+
+            return self._link_album_item_skipped(album_item_meta)
+        except FileNotFoundError:
+            raise ValueError(f'missing source file') from None
 
         return 'synced'
 
+    def _copy_album_item(self, src_file: str, dest_file: str) -> None:
+        # exclusive create, so an existing file fails with FileExistsError like the links do instead of being overwritten
+        with open(src_file, 'rb') as src, open(dest_file, 'xb') as dest:
+            try:
+                shutil.copyfileobj(src, dest)
+            except BaseException:
+                # don't leave a partial copy behind, it would be skipped as existing on the next sync
+                dest.close()
+                os.remove(dest_file)
+                raise
+
+        # preserve file metadata like copy2
+        shutil.copystat(src_file, dest_file)
+
+    def _dir_has_file(self, dir_path: str, file_name: str) -> bool:
+        # list each directory once (a few getdents calls) instead of a stat call per linked item.
+        # the listing is not refreshed until the next sync, only use it for dirs that don't change during the sync
+        files = self._dirs_files.get(dir_path)
+
+        if files is None:
+            try:
+                with os.scandir(dir_path) as entries:
+                    files = {entry.name for entry in entries if entry.is_file()}
+            except FileNotFoundError:
+                files = set()
+
+            # listed outside the lock. if another thread listed the same dir meanwhile, its listing is kept
+            with self._fs_cache_lock:
+                files = self._dirs_files.setdefault(dir_path, files)
+
+        return file_name in files
+
+    def _link_album_item_skipped(self, album_item_meta: dict) -> str:
+        self._logger.debug(f'Sync for album item "{album_item_meta["item_name"]}" ("{album_item_meta["album_name"]}") skipped. Item already exists')
+
+        return 'skipped'
+
     def _delete_obsolete_albums_items_by_db(self) -> ActionStats:
         limit = 100
-        offset = 0
+        last_id = 0
         total = self._model.get_albums_items_meta_cnt(status='stale')
         info = ActionStats(deleted=0, failed=0)
 
         if not total:
             return info
 
-        while True:
-            to_delete = self._model.search_albums_items_meta(limit=limit, offset=offset, status='stale')
+        # files of a page are removed in parallel, meta of the removed ones with a single statement
+        with ThreadPoolExecutor(max_workers=self._delete_concurrency) as executor:
+            while True:
+                to_delete = self._model.search_albums_items_meta(limit=limit, after_id=last_id, status='stale')
 
-            if not to_delete:
-                break
+                if not to_delete:
+                    break
+
+                last_id = to_delete[-1]['album_item_id']
+
+                self._model.begin()
 
-            for album_item_meta in to_delete:
+                try:
+                    deleted = []
+                    # group items by album, so each album directory is opened once
+                    albums_items = {}
+
+                    for album_item_meta in to_delete:
+                        albums_items.setdefault(album_item_meta['album_id'], []).append(album_item_meta)
+
+                    for (album_items_meta, errors) in zip(albums_items.values(), executor.map(self._delete_obsolete_album_items, albums_items.values())):
+                        for (album_item_meta, error) in zip(album_items_meta, errors):
+                            if error:
+                                self._logger.error(f'Deletion for album item "{album_item_meta["item_name"]}" ("{album_item_meta["album_name"]}") failed. Reason: {error}')
+
+                                info.increment(failed=1)
+                            else:
+                                deleted.append(album_item_meta['album_item_id'])
+
+                    # delete meta of all removed items at once
+                    self._model.delete_albums_items_meta(deleted)
+                    info.increment(deleted=len(deleted))
+
+                    self._model.commit()
+                except Exception:
+                    self._model.rollback()
+                    raise
+
+        return info
+
+    def _delete_obsolete_album_items(self, album_items_meta: list) -> list:
+        # items of a single album. returns an error (or None) for every item
+        dir_fd = self._open_album_dir(album_items_meta[0])
+        errors = []
+
+        try:
+            for album_item_meta in album_items_meta:
                 try:
                     if not album_item_meta['item_cname'] or not album_item_meta['album_cname']:
                         # if item_cname or album_cname is missing, most likely we have an item that exists in an album, but missing in media_items
@@ -512,33 +761,43 @@ class Albums:
                         # TODO: handle missing media_items
                         self._logger.warning(f'Broken meta for album item #{album_item_meta["album_item_id"]}')
                     else:
-                        self._delete_album_item_file(album_item_meta)
-                    self._model.delete_album_item_meta(album_item_meta['album_item_id'])
+                        self._delete_album_item_file(album_item_meta, dir_fd)
                 except Exception as e:
-                    self._logger.error(f'Deletion for album item "{album_item_meta["item_name"]}" ("{album_item_meta["album_name"]}") failed. Reason: {e}')
-
-                    offset += 1
-                    info.increment(failed=1)
+                    errors.append(e)
                 else:
-                    info.increment(deleted=1)
+                    errors.append(None)
+        finally:
+            if dir_fd is not None:
+                os.close(dir_fd)
 
-            self._model.commit()
+        return errors
 
-        return info
+    def _open_album_dir(self, album_item_meta: dict) -> int:
+        if not album_item_meta['album_cname'] or not _UNLINK_DIR_FD:
+            return None
+
+        try:
+            return os.open(self._get_album_dir(album_item_meta['album_path'], album_item_meta['album_cname']), os.O_RDONLY | os.O_DIRECTORY)
+        except OSError:
+            # files are removed by full path (missing ones are skipped there)
+            return None
     
     def _delete_obsolete_albums_items_by_fs(self) -> ActionStats:
         albums_items_path = os.path.join(self._dest_path, self._albums_dir)
         info = ActionStats(deleted=0, failed=0)
 
+        # fetch indexed items of all albums at once instead of querying each album directory
+        albums_items_cnames = self._model.get_albums_items_cnames_by_album()
+
         for root, dirs, files in os.walk(albums_items_path):
             if not files:
                 continue
 
-            for file in files:
-                album = os.path.basename(root)
-                album_item_meta = self._model.search_albums_items_meta(album_cname=album, item_cname=file)
+            album = os.path.basename(root)
+            album_items_cnames = albums_items_cnames.get(album, set())
 
-                if not album_item_meta:
+            for file in files:
+                if file not in album_items_cnames:
                     self._logger.debug(f'Album item "{file}" not found in database. Deleting')
 
                     try:
@@ -553,7 +812,7 @@ class Albums:
 
     def _rename_albums(self) -> ActionStats:
         limit = 100
-        offset = 0
+        last_id = 0
         total = self._model.get_albums_meta_cnt(rename=('not', ''))
         info = ActionStats(renamed=0, failed=0)
 
@@ -561,11 +820,13 @@ class Albums:
             return info
 
         while True:
-            to_rename = self._model.search_albums_meta(limit=limit, offset=offset, rename=('not', ''))
+            to_rename = self._model.search_albums_meta(limit=limit, after_id=last_id, rename=('not', ''))
 
             if not to_rename:
                 break
 
+            last_id = to_rename[-1]['album_id']
+
             for album_meta in to_rename:
                 new_name = album_meta['rename']
                 new_cname = self._get_canonicalized_name(new_name, album_meta['path'])
@@ -576,7 +837,6 @@ class Albums:
                 except Exception as e:
                     self._logger.error(f'Rename for album "{album_meta["name"]}" failed. Reason: {e}')
 
-                    offset += 1
                     info.increment(failed=1)
                 else:
                     info.increment(renamed=1)
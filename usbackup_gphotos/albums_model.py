@@ -11,11 +11,35 @@ class AlbumsModel:
 
         self._album_item_fields = 'mi.name item_name, a.name album_name, mi.cname item_cname, a.cname album_cname, mi.path item_path, a.path album_path, mi.status item_status, a.status album_status'
 
+        # statements executed for every album / page while indexing. built once, so the same sql text
+        # is passed each time and the compiled statement is reused from the connection cache
+        self._add_albums_items_query: str = '\n'.join((
+            "INSERT INTO albums_items (album_id, media_id, status)",
+            "VALUES (:album_id, :media_id, :status)",
+            "ON CONFLICT(album_id, media_id) DO UPDATE SET",
+            "status=:status",
+        ))
+        self._set_albums_items_stale_query: str = '\n'.join((
+            "UPDATE albums_items",
+            "SET status='stale'",
+            "WHERE album_id=:album_id",
+        ))
+
         self._ensure_table()
+        self._ensure_indexes()
+
+    def begin(self) -> None:
+        self._storage.begin()
 
     def commit(self) -> None:
         self._storage.commit()
 
+    def rollback(self) -> None:
+        self._storage.rollback()
+
+    def savepoint(self, name: str):
+        return self._storage.savepoint(name)
+
     def get_album_meta(self, *, album_id: int = None, remote_id: str = None) -> dict:
         if not album_id and not remote_id:
             raise ValueError('Missing media_id or remote_id')
@@ -35,14 +59,33 @@ class AlbumsModel:
             "LIMIT 1",
         )
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             row = cursor.fetchone()
 
             if not row:
                 return {}
 
-            return dict(row)
+            return row
         
+    def get_albums_meta_with_items_cnt(self, *, remote_ids: list) -> dict:
+        if not remote_ids:
+            return {}
+
+        placeholders = {}
+
+        query = (
+            "SELECT a.*, COUNT(ai.album_item_id) AS items_cnt",
+            "FROM albums a",
+            "LEFT JOIN albums_items ai ON ai.album_id=a.album_id AND ai.status!='stale'",
+            f"WHERE {self._storage.gen_in_condition('a.remote_id', remote_ids, placeholders)}",
+            "GROUP BY a.album_id",
+        )
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            rows = cursor.fetchall()
+
+            return {r['remote_id']: r for r in rows}
+
     def get_album_item_meta(self, *, album_item_id: int) -> dict:
         if not album_item_id:
             raise ValueError('Missing album_item_id')
@@ -60,13 +103,13 @@ class AlbumsModel:
 
         placeholders['album_item_id'] = album_item_id
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             row = cursor.fetchone()
 
             if not row:
                 return {}
 
-            return dict(row)
+            return row
         
     def get_albums_meta_cnt(self, *, status = None, rename = None) -> int:
         placeholders = {}
@@ -84,7 +127,7 @@ class AlbumsModel:
             f"WHERE {' AND '.join(where)}",
         )
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             row = cursor.fetchone()
 
             if not row:
@@ -108,7 +151,7 @@ class AlbumsModel:
             f"WHERE {' AND '.join(where)}",
         )
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             row = cursor.fetchone()
 
             if not row:
@@ -116,6 +159,24 @@ class AlbumsModel:
 
             return row['cnt']
 
+    def get_albums_items_cnt_by_album(self, album_ids: list) -> dict:
+        if not album_ids:
+            return {}
+
+        placeholders = {}
+
+        query = (
+            "SELECT album_id, COUNT(album_item_id) AS cnt",
+            "FROM albums_items",
+            f"WHERE {self._storage.gen_in_condition('album_id', album_ids, placeholders)}",
+            "GROUP BY album_id",
+        )
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            rows = cursor.fetchall()
+
+            return {r['album_id']: r['cnt'] for r in rows}
+
     def get_albums_meta_stats(self) -> dict:
         query = (
             "SELECT status, COUNT(status) AS cnt",
@@ -124,7 +185,7 @@ class AlbumsModel:
             "ORDER BY status ASC",
         )
 
-        with self._storage.execute(query) as cursor:
+        with self._storage.execute(query, commit=False) as cursor:
             rows = cursor.fetchall()
 
             if not rows:
@@ -140,7 +201,7 @@ class AlbumsModel:
             "ORDER BY status ASC",
         )
 
-        with self._storage.execute(query) as cursor:
+        with self._storage.execute(query, commit=False) as cursor:
             rows = cursor.fetchall()
 
             if not rows:
@@ -148,10 +209,14 @@ class AlbumsModel:
 
             return {r['status']: r['cnt'] for r in rows}
         
-    def search_albums_meta(self, *, limit: int = 100, offset: int = 0, cname = None, path = None, status = None, rename = None) -> list:
+    def search_albums_meta(self, *, limit: int = 100, after_id: int = None, cname = None, path = None, status = None, rename = None) -> list:
         placeholders = {}
         where = ['1=1']
 
+        if after_id:
+            where.append('album_id>:after_id')
+            placeholders['after_id'] = after_id
+
         if cname:
             where.append(self._storage.gen_eq_condition('cname', cname, placeholders))
 
@@ -169,24 +234,27 @@ class AlbumsModel:
             "FROM albums",
             f"WHERE {' AND '.join(where)}",
             "ORDER BY album_id ASC",
-            "LIMIT :limit OFFSET :offset",
+            "LIMIT :limit",
         )
 
         placeholders['limit'] = limit
-        placeholders['offset'] = offset
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             rows = cursor.fetchall()
 
             if not rows:
                 return []
 
-            return [dict(r) for r in rows]
+            return rows
         
-    def search_albums_items_meta(self, *, limit: int = 100, offset: int = 0, status = None, album_cname = None, item_cname = None) -> list:
+    def search_albums_items_meta(self, *, limit: int = 100, after_id: int = None, status = None, album_cname = None, item_cname = None) -> list:
         placeholders = {}
         where = ['1=1']
 
+        if after_id:
+            where.append('ai.album_item_id>:after_id')
+            placeholders['after_id'] = after_id
+
         if status:
             where.append(self._storage.gen_in_condition('ai.status', status, placeholders))
 
@@ -202,20 +270,51 @@ class AlbumsModel:
             "LEFT JOIN albums a ON ai.album_id=a.album_id",
             "LEFT JOIN media_items mi ON ai.media_id=mi.media_id",
             f"WHERE {' AND '.join(where)}",
-            "ORDER BY album_id ASC, media_id ASC",
-            "LIMIT :limit OFFSET :offset",
+            "ORDER BY ai.album_item_id ASC",
+            "LIMIT :limit",
         )
 
         placeholders['limit'] = limit
-        placeholders['offset'] = offset
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             rows = cursor.fetchall()
 
             if not rows:
                 return []
 
-            return [dict(r) for r in rows]
+            return rows
+
+    def get_albums_cnames(self, *, path: str) -> set:
+        placeholders = {}
+
+        query = (
+            "SELECT cname",
+            "FROM albums",
+            "WHERE path=:path",
+        )
+
+        placeholders['path'] = path
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            rows = cursor.fetchall()
+
+            return {r['cname'] for r in rows}
+
+    def get_albums_items_cnames_by_album(self) -> dict:
+        query = (
+            "SELECT a.cname AS album_cname, mi.cname",
+            "FROM albums_items ai",
+            "INNER JOIN albums a ON ai.album_id=a.album_id",
+            "LEFT JOIN media_items mi ON ai.media_id=mi.media_id",
+        )
+
+        albums_items_cnames = {}
+
+        with self._storage.execute(query, commit=False) as cursor:
+            for r in cursor.fetchall():
+                albums_items_cnames.setdefault(r['album_cname'], set()).add(r['cname'])
+
+        return albums_items_cnames
 
     def update_album_meta(self, album_id: int, **kwargs) -> int:
         if not album_id:
@@ -238,7 +337,6 @@ class AlbumsModel:
             "UPDATE albums",
             f"SET {update}",
             "WHERE album_id=:album_id",
-            "LIMIT 1",
         )
     
         placeholders['album_id'] = album_id
@@ -268,7 +366,6 @@ class AlbumsModel:
             "UPDATE albums_items",
             f"SET {update}",
             "WHERE album_item_id=:album_item_id",
-            "LIMIT 1",
         )
 
         placeholders['album_item_id'] = album_item_id
@@ -276,6 +373,53 @@ class AlbumsModel:
         with self._storage.execute(query, placeholders, commit=False) as cursor:
             return cursor.rowcount
 
+    def update_albums_items_meta_bulk(self, updates: list) -> int:
+        if not updates:
+            return 0
+
+        placeholders = {}
+        cases = []
+        ids = []
+
+        for i, update in enumerate(updates):
+            if not update.get('album_item_id'):
+                raise ValueError('Missing album_item_id')
+
+            if update.get('status') not in self._item_statuses:
+                raise ValueError(f'Invalid status "{update.get("status")}"')
+
+            cases.append(f'WHEN :case_id_{i} THEN :case_status_{i}')
+            placeholders[f'case_id_{i}'] = update['album_item_id']
+            ids.append(update['album_item_id'])
+            placeholders[f'case_status_{i}'] = update['status']
+
+        # update all items with a single statement
+        query = (
+            "UPDATE albums_items",
+            f"SET status=CASE album_item_id {' '.join(cases)} END",
+            f"WHERE {self._storage.gen_in_condition('album_item_id', ids, placeholders)}",
+        )
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            return cursor.rowcount
+
+    def update_albums_last_checked(self, album_ids: list, last_checked: str) -> int:
+        if not album_ids:
+            return 0
+
+        placeholders = {}
+
+        query = (
+            "UPDATE albums",
+            "SET last_checked=:last_checked",
+            f"WHERE {self._storage.gen_in_condition('album_id', album_ids, placeholders)}",
+        )
+
+        placeholders['last_checked'] = last_checked
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            return cursor.rowcount
+
     def set_albums_meta_stale(self, *, last_checked: str = None) -> int:
         placeholders = {}
         where = ['1=1']
@@ -298,18 +442,28 @@ class AlbumsModel:
             raise ValueError('Missing album_id')
         
         placeholders = {}
-        where = ['1=1']
 
-        if album_id:
-            where.append(self._storage.gen_eq_condition('album_id', album_id, placeholders))
+        placeholders['album_id'] = album_id
+
+        # committed together with the album items of the album
+        with self._storage.execute(self._set_albums_items_stale_query, placeholders, commit=False) as cursor:
+            return cursor.rowcount
+
+    def set_albums_items_meta_stale_by_album_status(self, album_status: str) -> int:
+        if album_status not in self._album_statuses:
+            raise ValueError(f'Invalid status "{album_status}"')
+
+        placeholders = {}
 
         query = (
             "UPDATE albums_items",
             "SET status='stale'",
-            f"WHERE {' AND '.join(where)}",
+            "WHERE album_id IN (SELECT album_id FROM albums WHERE status=:album_status)",
+            # items of albums left stale by a previous run are already stale, don't rewrite them
+            "AND status!='stale'",
         )
 
-        placeholders['album_id'] = album_id
+        placeholders['album_status'] = album_status
 
         with self._storage.execute(query, placeholders) as cursor:
             return cursor.rowcount
@@ -323,7 +477,6 @@ class AlbumsModel:
         query = (
             "DELETE FROM albums",
             "WHERE album_id=:album_id",
-            "LIMIT 1",
         )
 
         placeholders['album_id'] = album_id
@@ -331,6 +484,20 @@ class AlbumsModel:
         with self._storage.execute(query, placeholders, commit=False) as cursor:
             return cursor.rowcount
 
+    def delete_albums_meta(self, album_ids: list) -> int:
+        if not album_ids:
+            return 0
+
+        placeholders = {}
+
+        query = (
+            "DELETE FROM albums",
+            f"WHERE {self._storage.gen_in_condition('album_id', album_ids, placeholders)}",
+        )
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            return cursor.rowcount
+
     def delete_album_item_meta(self, album_item_id: int) -> int:
         if not album_item_id:
             raise ValueError('Missing album_item_id')
@@ -340,7 +507,6 @@ class AlbumsModel:
         query = (
             "DELETE FROM albums_items",
             "WHERE album_item_id=:album_item_id",
-            "LIMIT 1",
         )
 
         placeholders['album_item_id'] = album_item_id
@@ -348,6 +514,20 @@ class AlbumsModel:
         with self._storage.execute(query, placeholders, commit=False) as cursor:
             return cursor.rowcount
 
+    def delete_albums_items_meta(self, album_item_ids: list) -> int:
+        if not album_item_ids:
+            return 0
+
+        placeholders = {}
+
+        query = (
+            "DELETE FROM albums_items",
+            f"WHERE {self._storage.gen_in_condition('album_item_id', album_item_ids, placeholders)}",
+        )
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            return cursor.rowcount
+
     def add_album_meta(
             self,
             remote_id: str,
@@ -359,7 +539,7 @@ class AlbumsModel:
             index_date: str,
             last_checked: str,
             status: str = None
-        ) -> int:
+        ) -> dict:
         placeholders = {}
 
         if status and status not in self._album_statuses:
@@ -370,6 +550,7 @@ class AlbumsModel:
             "VALUES (:remote_id, :name, :cname, :size, :cover_photo_id, :path, :index_date, :last_checked, :status)",
             "ON CONFLICT(remote_id) DO UPDATE SET",
             "size=:size, cover_photo_id=:cover_photo_id, index_date=:index_date, last_checked=:last_checked, status=:status",
+            "RETURNING *",
         )
 
         placeholders['remote_id'] = remote_id
@@ -383,7 +564,8 @@ class AlbumsModel:
         placeholders['status'] = status or 'pending_sync'
 
         with self._storage.execute(query, placeholders, commit=False) as cursor:
-            return cursor.lastrowid
+            # return the stored row, so callers don't need to fetch it again
+            return cursor.fetchone()
 
     def add_album_item_meta(self, *, album_id: int, media_item_id: int, status: str = None) -> int:
         placeholders = {}
@@ -401,6 +583,19 @@ class AlbumsModel:
 
         with self._storage.execute(query, placeholders, commit=False) as cursor:
             return cursor.lastrowid
+
+    def add_albums_items_meta_bulk(self, rows: list) -> int:
+        if not rows:
+            return 0
+
+        for row in rows:
+            if row.get('status') and row['status'] not in self._item_statuses:
+                raise ValueError(f'Invalid status "{row["status"]}"')
+
+        rows = [{'album_id': row['album_id'], 'media_id': row['media_id'], 'status': row.get('status') or 'pending_sync'} for row in rows]
+
+        with self._storage.executemany(self._add_albums_items_query, rows, commit=False) as cursor:
+            return cursor.rowcount
         
     def _ensure_table(self) -> None:
         # create albums table if not exists
@@ -438,3 +633,17 @@ class AlbumsModel:
 
         with self._storage.execute(query):
             pass
+
+    def _ensure_indexes(self) -> None:
+        # (album_id, media_id) is already covered by the albums_items unique constraint
+        queries = [
+            # paged searches by status (ordered by primary key)
+            "CREATE INDEX IF NOT EXISTS albums_status_idx ON albums (status, album_id)",
+            "CREATE INDEX IF NOT EXISTS albums_items_status_idx ON albums_items (status, album_item_id)",
+            # non stale items counts by album (covering, table rows are not read)
+            "CREATE INDEX IF NOT EXISTS albums_items_album_status_idx ON albums_items (album_id, status)",
+        ]
+
+        for query in queries:
+            with self._storage.execute(query):
+                pass
@@ -1,12 +1,20 @@
 import os
 import logging
 import json
-import hashlib
 import time
 import requests
 import base64
-from urllib.parse import urlparse, parse_qs
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+from urllib.parse import urlparse, parse_qs, urlencode, quote
+from urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# prefer orjson (faster, works on bytes) if available, fallback to stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 __all__ = ['GAuth', 'GAuthError', 'GAuthValueError']
 
@@ -16,26 +24,103 @@ class GAuthError(Exception):
 class GAuthValueError(Exception):
     pass
 
+# refresh token posts are retried on these statuses, with these delays (seconds) between attempts
+_TOKEN_RETRY_STATUSES = frozenset([500, 502, 503, 504])
+_TOKEN_RETRY_DELAYS = (0.2, 0.4, 0.8)
+_TOKEN_KEYS = frozenset(['access_token', 'refresh_token', 'scope', 'token_type', 'expires_at'])
+# keys a token response must contain, by grant type
+_REQUIRED_TOKEN_KEYS = {
+    'authorization_code': ('access_token', 'refresh_token', 'expires_in'),
+    'refresh_token': ('access_token', 'expires_in'),
+}
+
+_AUTH_OK_BODY = b'<html><head><title>Authentication successful</title></head><body><p>Authentication successful, you can close this window now.</p></body></html>'
+_AUTH_FAIL_BODY = b'<html><head><title>Authentication failed</title></head><body><p>Authentication failed, please try again.</p></body></html>'
+_NOT_FOUND_BODY = b'<html><head><title>Not found</title></head><body><p>Not found.</p></body></html>'
+
+class _AuthHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+
+        # the code is only sent to the redirect uri root, skip other requests (favicon) without parsing them
+        if url.path not in ['', '/']:
+            self._send_body(404, _NOT_FOUND_BODY)
+            return
+
+        codes = parse_qs(url.query).get('code')
+        code = codes[0] if codes else None
+
+        if code:
+            self._send_body(200, _AUTH_OK_BODY)
+
+            self.server.code = code
+            self.server.code_event.set()
+        else:
+            self._send_body(400, _AUTH_FAIL_BODY)
+
+    def log_message(self, format, *args):
+        # disable logging
+        pass
+
+    def _send_body(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header('Content-type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        self.wfile.write(body)
+
 class GAuth:
     def __init__(self, credentials_file: str, token_hash: str, scopes: list, *, logger: logging.Logger) -> None:
         self._logger: logging.Logger = logger.getChild('gauth')
 
         self._credentials: dict = self._parse_credentials(credentials_file)
         self._token: dict = self._parse_token(token_hash)
+        # token expiry on the monotonic clock (derived from expires_at), so wall clock jumps don't affect expiry checks
+        self._expires_monotonic: float = None
+        # (access token, monotonic time until it's handed out without checks)
+        self._cached_access: tuple = None
+        self._refresh_lock: threading.Lock = threading.Lock()
 
         self._scopes = scopes
 
-        self._client_id: str = self._credentials.get('client_id', '')
-        self._client_id_hash: str = hashlib.md5(self._client_id.encode()).hexdigest()
-        self._client_secret: str = self._credentials.get('client_secret', '')
-
         self._auth_callback: callable = None
         self._use_webserver: bool = False
         self._listen_port: int = 8080
 
+        # keep the connection to the token endpoint alive between refreshes
+        self._session: requests.Session = requests.Session()
+
+        # default allowed_methods, so token posts are only retried on connection errors (request never sent).
+        # an auth code can be used once, refresh posts are retried on server errors in _post_token_request
+        retries = Retry(
+            total=3,
+            backoff_factor=0.2,
+            raise_on_status=False,
+        )
+
+        self._session.mount("https://", HTTPAdapter(max_retries=retries, pool_connections=1, pool_maxsize=4))
+
     @property
     def access_token(self) -> str:
-        return self._token.get('access_token', '')
+        cached = self._cached_access
+
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
+        # api calls run from several threads, make sure an expiring token is refreshed only once
+        with self._refresh_lock:
+            if not self._cached_access or self._cached_access[1] <= time.monotonic():
+                if not self._token_exists():
+                    return ''
+
+                if self._token_expired() and self._token.get('refresh_token'):
+                    self._logger.info(f'Access token about to expire, refreshing')
+                    self._refresh_existing_token()
+
+                self._cached_access = (self._token.get('access_token', ''), self._token_expires_monotonic() - 60)
+
+            return self._cached_access[0]
     
     def set_auth_callback(self, callback: callable) -> None:
         self._auth_callback = callback
@@ -44,17 +129,24 @@ class GAuth:
         self._use_webserver = True
         self._listen_port = port
     
-    def ensure_valid_auth(self) -> None:
+    def ensure_valid_auth(self, *, skew: int = 60) -> None:
         if not self._token_exists():
             raise GAuthError('No access token found. Please use the "auth" command to authenticate first')
         
-        if self._token_expired():
+        # refresh tokens about to expire too, so the next api call doesn't fail with 401 and retry
+        with self._refresh_lock:
+            if self._token_expired(skew=skew):
+                self._refresh_existing_token()
+
+    def refresh_token(self, *, rejected: str = None) -> None:
+        with self._refresh_lock:
+            # concurrent calls rejected with the same token refresh it only once, the rest use the new one
+            if rejected and rejected != self._token.get('access_token'):
+                return
+
+            self._logger.info(f'Access token expired, refreshing')
             self._refresh_existing_token()
 
-    def refresh_token(self) -> None:
-        self._logger.info(f'Access token expired, refreshing')
-        self._refresh_existing_token()
-
     def issue_new_token(self) -> None:
         self._logger.info(f'Issuing new access token')
         self._issue_new_token()
@@ -76,23 +168,35 @@ class GAuth:
         if not token_hash:
             return {}
 
+        if orjson:
+            return orjson.loads(base64.b64decode(token_hash.encode()))
+
         return json.loads(base64.b64decode(token_hash.encode()).decode())
     
     def _encrypt_token(self) -> str:
+        if orjson:
+            return base64.b64encode(orjson.dumps(self._token)).decode()
+
         return base64.b64encode(json.dumps(self._token).encode()).decode()
     
     def _token_exists(self) -> bool:
         return True if self._token.get('access_token') else False
     
-    def _token_expired(self) -> bool:
+    def _token_expired(self, *, skew: int = 60) -> bool:
         if not self._token.get('access_token'):
             raise GAuthError('Access token not found')
 
-        if self._token.get('expires_at') < time.time():
+        if self._token_expires_monotonic() - skew < time.monotonic():
             return True
 
         return False
     
+    def _token_expires_monotonic(self) -> float:
+        if self._expires_monotonic is None:
+            self._expires_monotonic = time.monotonic() + (self._token.get('expires_at', 0) - time.time())
+
+        return self._expires_monotonic
+    
     def _refresh_existing_token(self) -> None:
         if not self._token.get('refresh_token'):
             raise GAuthError('Refresh token not found')
@@ -131,47 +235,35 @@ class GAuth:
     def _gen_auth_url(self) -> str:
         params = {
             'client_id': self._credentials['client_id'],
-            'redirect_uri': self._credentials['redirect_uris'][0] + ':' + str(self._listen_port),
+            'redirect_uri': self._gen_redirect_uri(),
             'response_type': 'code',
-            'scope': '+'.join(self._scopes),
+            'scope': ' '.join(self._scopes),
             'access_type': 'offline',
         }
 
-        url = self._credentials['auth_uri'] + '?' + '&'.join([f'{k}={v}' for k, v in params.items()])
+        # scopes are urls, so values must be percent encoded (spaces as %20)
+        url = self._credentials['auth_uri'] + '?' + urlencode(params, quote_via=quote)
 
         return url
     
+    def _gen_redirect_uri(self) -> str:
+        return self._credentials['redirect_uris'][0] + ':' + str(self._listen_port)
+    
     def _get_auth_code_from_webserver(self) -> str:
-        class AuthHandler(BaseHTTPRequestHandler):
-            def do_GET(self):
-                code = parse_qs(urlparse(self.path).query).get('code')[0]
-
-                if code:
-                    self.send_response(200)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-
-                    self.wfile.write(b'<html><head><title>Authentication successful</title></head>')
-                    self.wfile.write(b'<body><p>Authentication successful, you can close this window now.</p></body></html>')
-
-                    self.server.code = code
-                else:
-                    self.send_response(400)
-                    self.send_header('Content-type', 'text/html')
-                    self.end_headers()
-
-                    self.wfile.write(b'<html><head><title>Authentication failed</title></head>')
-                    self.wfile.write(b'<body><p>Authentication failed, please try again.</p></body></html>')
-
-        server = HTTPServer(('localhost', self._listen_port), AuthHandler)
-
-        # disable logging
-        server.log_message = lambda format, *args: None
+        server = ThreadingHTTPServer(('localhost', self._listen_port), _AuthHandler)
 
         server.code = ''
+        server.code_event = threading.Event()
+
+        # serve in background and wait until a request brings the code
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
 
-        while not server.code:
-            server.handle_request()
+        try:
+            server.code_event.wait()
+        finally:
+            server.shutdown()
+            server.server_close()
 
         return server.code
 
@@ -188,51 +280,52 @@ class GAuth:
         if not parsed_url.query:
             raise GAuthValueError('Invalid url')
 
-        query_params = parse_qs(parsed_url.query)
+        codes = parse_qs(parsed_url.query).get('code')
 
-        if not query_params.get('code'):
+        if not codes:
             raise GAuthValueError('Invalid url')
 
-        code = query_params.get('code')[0]
-
-        return code
+        return codes[0]
     
     def _update_token(self, data: dict, *, replace: bool = False) -> None:
-        allowed_keys = ['access_token', 'refresh_token', 'scope', 'token_type', 'expires_at']
-
         # filter allowed keys
-        data = {k: v for k, v in data.items() if k in allowed_keys}
+        data = {k: data[k] for k in data.keys() & _TOKEN_KEYS}
 
         if replace:
             self._token = data
         else:
-            for (tkey, tval) in data.items():
-                self._token[tkey] = tval
+            self._token.update(data)
+
+        # recomputed from the new expires_at on next check
+        self._expires_monotonic = None
+        self._cached_access = None
 
         if self._auth_callback:
             self._auth_callback(self._encrypt_token())
     
     def _gen_oauth2_token(self, grant_type: str, *, code: str = None, refresh_token: str = None) -> dict:
+        if grant_type not in _REQUIRED_TOKEN_KEYS:
+            raise GAuthValueError(f'Invalid grant type "{grant_type}"')
+
         post_params = {
             'client_id': self._credentials['client_id'],
-            'client_secret': self._credentials['client_secret']
+            'client_secret': self._credentials['client_secret'],
+            'grant_type': grant_type,
         }
 
-        if ('authorization_code' == grant_type):
+        if 'authorization_code' == grant_type:
             if not code:
                 raise GAuthValueError('Code not provided')
 
-            post_params['grant_type'] = grant_type
             post_params['code'] = code
-            post_params['redirect_uri'] = self._credentials['redirect_uris'][0] + ':' + str(self._listen_port)
-        elif('refresh_token' == grant_type):
+            post_params['redirect_uri'] = self._gen_redirect_uri()
+        else:
             if not refresh_token:
                 raise GAuthValueError('Refresh token not provided')
-            
-            post_params['grant_type'] = grant_type
+
             post_params['refresh_token'] = refresh_token
 
-        response = requests.post(self._credentials['token_uri'], data=post_params)
+        response = self._post_token_request(post_params, retry=grant_type == 'refresh_token')
 
         self._logger.debug(f'OAuth2 token response: {response.text}')
 
@@ -249,12 +342,7 @@ class GAuth:
         
         token = response.json()
 
-        if 'authorization_code' == grant_type:
-            required_keys = ['access_token', 'refresh_token', 'expires_in']
-        elif 'refresh_token' == grant_type:
-            required_keys = ['access_token', 'expires_in']
-
-        for key in required_keys:
+        for key in _REQUIRED_TOKEN_KEYS[grant_type]:
             if not token.get(key):
                 raise GAuthError(f'Invalid token, missing {key}')
 
@@ -262,4 +350,20 @@ class GAuth:
 
         del token['expires_in']
         
-        return token
\ No newline at end of file
+        return token
+
+    def _post_token_request(self, post_params: dict, *, retry: bool = False) -> requests.Response:
+        attempts = len(_TOKEN_RETRY_DELAYS) + 1 if retry else 1
+
+        for attempt in range(attempts):
+            try:
+                response = self._session.post(self._credentials['token_uri'], data=post_params, timeout=(5, 30))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == attempts - 1:
+                    raise
+            else:
+                if response.status_code not in _TOKEN_RETRY_STATUSES or attempt == attempts - 1:
+                    return response
+
+            self._logger.debug(f'Retrying token request ({attempt + 1}/{attempts - 1})')
+            time.sleep(_TOKEN_RETRY_DELAYS[attempt])
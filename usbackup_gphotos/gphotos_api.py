@@ -148,10 +148,12 @@ class GPhotosApi:
 
         headers = {}
 
-        if not self._gauth.access_token:
+        access_token = self._gauth.access_token
+
+        if not access_token:
             raise GPhotosApiException('Invalid access token')
 
-        headers['Authorization'] = 'Bearer ' + self._gauth.access_token
+        headers['Authorization'] = 'Bearer ' + access_token
 
         if method == 'post':
             headers['Content-Type'] = 'application/json'
@@ -164,7 +166,7 @@ class GPhotosApi:
         # refresh token and retry
         if resp.status_code == 401:
             if retry < 3:
-                self._gauth.refresh_token()
+                self._gauth.refresh_token(rejected=access_token)
 
                 self._logger.debug(f'Refreshed access token and retrying API call (retry={retry+1})')
 
@@ -1,5 +1,6 @@
 import os
 import logging
+import threading
 from datetime import datetime
 from usbackup_gphotos.gauth import GAuth
 from usbackup_gphotos.gphotos_api import GPhotosApi
@@ -23,6 +24,12 @@ class UsBackupGPhotosIdentity:
         self._settings: dict = None
         self._lock_file: str = None
 
+        # token refreshes during a sync run on worker threads, while this thread may have a transaction open
+        # on the same connection. their token hash is kept here and written by this thread
+        self._owner_thread: int = threading.get_ident()
+        self._pending_token_hash: str = None
+        self._pending_token_hash_lock: threading.Lock = threading.Lock()
+
         self._gauth: GAuth = None
         self._media_items: MediaItems = None
         self._albums: Albums = None
@@ -55,18 +62,23 @@ class UsBackupGPhotosIdentity:
     def index(self, options: dict) -> None:
         self._gauth.ensure_valid_auth()
 
-        if not options.get('skip_media_items'):
-            self._index_media_items(
-                last_index=self._settings.get('media_items_last_index', None),
-                rescan=options.get('rescan', False)
-            )
+        try:
+            if not options.get('skip_media_items'):
+                self._index_media_items(
+                    last_index=self._settings.get('media_items_last_index', None),
+                    rescan=options.get('rescan', False)
+                )
 
-        if not options.get('skip_albums'):
-            self._index_albums(
-                last_index=self._settings.get('albums_last_index', None),
-                rescan=options.get('rescan', False),
-                filter_albums=options.get('albums', []),
-            )
+                self._save_pending_token_hash()
+
+            if not options.get('skip_albums'):
+                self._index_albums(
+                    last_index=self._settings.get('albums_last_index', None),
+                    rescan=options.get('rescan', False),
+                    filter_albums=options.get('albums', []),
+                )
+        finally:
+            self._save_pending_token_hash()
 
     def sync(self, options: dict) -> None:
         self._gauth.ensure_valid_auth()
@@ -79,16 +91,21 @@ class UsBackupGPhotosIdentity:
                 'albums': options.get('albums', []),
             })
 
-        self._scan_synced()
+        try:
+            self._scan_synced()
+
+            self._sync_media_items(
+                concurrency=options.get('concurrency', 20),
+            )
 
-        self._sync_media_items(
-            concurrency=options.get('concurrency', 20),
-        )
+            self._save_pending_token_hash()
 
-        self._sync_albums(
-            concurrency=options.get('concurrency', 20),
-            sync_mode=options.get('albums_sync_mode', 'sync'),
-        )
+            self._sync_albums(
+                concurrency=options.get('concurrency', 20),
+                sync_mode=options.get('albums_sync_mode', 'sync'),
+            )
+        finally:
+            self._save_pending_token_hash()
 
     def delete_obsolete(self) -> None:
         self._delete_obsolete_media_items()
@@ -151,11 +168,12 @@ class UsBackupGPhotosIdentity:
         self._albums = Albums(library_dir, model=a_model, google_api=google_api, media_items=self._media_items, logger=self._logger)
 
     def _gen_data_dir(self, data_dir: str) -> str:
-        data_dir = os.path.realpath(data_dir)
-
+        # check before resolving, realpath of an empty path is the current directory
         if not data_dir:
             raise UsBackupGPhotosIdentityError('Data dir not provided')
 
+        data_dir = os.path.realpath(data_dir)
+
         if not os.path.exists(data_dir):
             self._logger.info(f'Creating destination directory "{data_dir}"')
             os.makedirs(data_dir)
@@ -167,11 +185,34 @@ class UsBackupGPhotosIdentity:
         return data_dir
     
     def _update_aseting(self, key: str, value: str) -> int:
-        return self._settings_model.update_aseting(key, value)
+        # every write is a separate commit, skip the ones that would not change anything
+        if self._settings.get(key) == value:
+            return 0
+
+        updated = self._settings_model.update_aseting(key, value)
+
+        # cached only once stored, a failed write is retried on the next call
+        self._settings[key] = value
+
+        return updated
     
     def _update_token_hash(self, token_hash: str) -> None:
+        if threading.get_ident() != self._owner_thread:
+            with self._pending_token_hash_lock:
+                self._pending_token_hash = token_hash
+
+            return
+
         self._update_aseting('token_hash', token_hash)
 
+    def _save_pending_token_hash(self) -> None:
+        with self._pending_token_hash_lock:
+            token_hash = self._pending_token_hash
+            self._pending_token_hash = None
+
+        if token_hash is not None:
+            self._update_aseting('token_hash', token_hash)
+
     def _index_media_items(self, *args, **kwargs) -> None:
         self._logger.info(f'* Indexing media items')
 
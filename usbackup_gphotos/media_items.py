@@ -10,7 +10,7 @@ from requests.adapters import HTTPAdapter
 from usbackup_gphotos.media_items_model import MediaItemsModel
 from usbackup_gphotos.gphotos_api import GPhotosApi
 from usbackup_gphotos.action_stats import ActionStats
-from usbackup_gphotos.utils import transform_fs_safe, gen_batch_stats
+from usbackup_gphotos.utils import transform_fs_safe, gen_batch_stats, paginate, format_now, process_queued
 
 __all__ = ['MediaItems', 'MediaItemDownloadError']
 
@@ -32,84 +32,22 @@ class MediaItems:
 
         self._items_dir = 'items'
 
+        # taken item cnames by path. names are only added while indexing, so a stale set
+        # can only hold extra names (which just skips a suffix), never miss a taken one
+        self._items_cnames: dict = {}
+
     @property
     def dest_path(self) -> str:
         return self._dest_path
 
     def index_items(self, *, last_index: str = None, rescan: bool = False) -> ActionStats:
-        from_date = None
-        page_token = None
-        limit = self._media_items_list_limit
-        filters = {}
-        check_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        info = ActionStats(indexed=0, skipped=0, failed=0)
-
-        filters['mediaTypeFilter'] = {
-            'mediaTypes': ['ALL_MEDIA'],
-        }
-
-        if not rescan and last_index:
-            from_date = datetime.strptime(last_index, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d')
-
-        if from_date:
-            to_date = '9999-12-31'
-
-            filters['dateFilter'] = {
-                'ranges': [
-                    {
-                        'startDate': GPhotosApi.format_date(from_date),
-                        'endDate': GPhotosApi.format_date(to_date),
-                    }
-                ],
-            }
-
-            self._logger.info(f'Searching media items starting from {from_date}')
-
-        while True:
-            to_index = self._google_api.media_items_search(page_token=page_token, page_size=limit, filters=filters)
-
-            if not to_index:
-                break
-
-            media_items = to_index.get('mediaItems', [])
-            page_token = to_index.get('nextPageToken')
-            batch_indexed = 0
-
-            for media_item in media_items:
-                try:
-                    status = self.index_item(media_item, commit=False)
-                except Exception as e:
-                    self._logger.error(f'Index for media item "{media_item["filename"]}" failed. {e}')
-                    info.increment(failed=1)
-                else:
-                    if status == 'indexed':
-                        info.increment(indexed=1)
-                        batch_indexed += 1
-                    else:
-                        info.increment(skipped=1)
-
-            self._model.commit()
-
-            if batch_indexed:
-                self._logger.info(f'Media items batch index: indexed {batch_indexed}')
-
-            if not page_token:
-                break
-
-        if rescan:
-            # mark all items older than check_date date as stale
-            stale_cnt = self._model.set_media_items_stale(last_checked=check_date)
-
-            if stale_cnt:
-                self._logger.info(f'Marked {stale_cnt} media items as stale')
-
-        return info
+        return asyncio.run(self._index_items(last_index=last_index, rescan=rescan))
     
     def index_item(self, media_item: dict, *, commit=True) -> str:
         media_item_meta = self.get_item_meta(remote_id=media_item['id'])
 
         if not self._index_needed(media_item_meta, media_item):
-            last_checked = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            last_checked = format_now()
             self._model.update_media_item_meta(media_item_meta['media_id'], last_checked=last_checked)
 
             self._logger.debug(f'Index for media item "{media_item_meta["name"]}" skipped. Index not needed')
@@ -123,6 +61,15 @@ class MediaItems:
 
         return 'indexed'
 
+    def index_items_bulk(self, media_items: list) -> dict:
+        # same as index_item, but for a whole page of media items. returns media ids by remote id
+        (media_ids, info) = self._index_items_batch(media_items)
+
+        if info['failed']:
+            raise ValueError(f'Index for {info["failed"]} media items failed')
+
+        return media_ids
+
     def sync_items(self, *, concurrency: int = 1) -> ActionStats:
         self._dl_session = requests.Session()
 
@@ -143,10 +90,10 @@ class MediaItems:
         info = ActionStats(deleted=0, failed=0)
 
         db_info = self._delete_obsolete_items_by_db()
-        info.increment(**dict(db_info))
+        info.merge(db_info)
 
         fs_info = self._delete_obsolete_items_by_fs()
-        info.increment(**dict(fs_info))
+        info.merge(fs_info)
 
         return info
 
@@ -183,7 +130,7 @@ class MediaItems:
 
     def scan_synced_items_fs(self) -> ActionStats:
         limit = 100
-        offset = 0
+        last_id = 0
         total = self._model.get_media_items_meta_cnt(status='synced')
         info = ActionStats(fixed=0)
 
@@ -191,22 +138,26 @@ class MediaItems:
             return info
         
         while True:
-            to_check = self._model.search_media_items_meta(limit=limit, offset=offset, status='synced')
+            to_check = self._model.search_media_items_meta(limit=limit, after_id=last_id, status='synced')
 
             if not to_check:
                 break
 
+            last_id = to_check[-1]['media_id']
+
+            updates = []
+
             for media_item_meta in to_check:
                 if not self._item_exists_fs(media_item_meta):
                     self._logger.debug(f'Media item "{media_item_meta["name"]}" not found on filesystem. Setting status to pending_sync')
-                    self._model.update_media_item_meta(media_item_meta['media_id'], status='pending_sync')
+                    updates.append({'media_id': media_item_meta['media_id'], 'status': 'pending_sync'})
 
                     info.increment(fixed=1)
 
+            # update all missing items of the page at once
+            self._model.update_media_items_meta_bulk(updates)
             self._model.commit()
 
-            offset += limit
-
         return info
 
     def _get_canonicalized_name(self, file_name: str, path: str) -> str:
@@ -219,18 +170,25 @@ class MediaItems:
 
         file_name = f'{name}{ext}'
 
-        while True:
-            if not self._model.search_media_items_meta(cname=file_name, path=path):
-                return file_name
-            
+        # fetch all taken names of the path once, then find the first free suffix locally
+        if path not in self._items_cnames:
+            self._items_cnames[path] = self._model.get_media_items_cnames(path=path)
+
+        cnames = self._items_cnames[path]
+
+        while file_name in cnames:
             name, ext = os.path.splitext(file_name)
 
             file_name = f'{name} ({unique}){ext}'
 
             unique += 1
 
-    async def _get_items_to_sync(self, *, limit: int = 100, offset: int = 0) -> list:
-        media_items_meta = self._model.search_media_items_meta(limit=limit, offset=offset, status=['pending_sync', 'sync_error'])
+        cnames.add(file_name)
+
+        return file_name
+
+    async def _get_items_to_sync(self, *, limit: int = 100, after_id: int = None) -> list:
+        media_items_meta = self._model.search_media_items_meta(limit=limit, after_id=after_id, status=['pending_sync', 'sync_error'])
 
         if not media_items_meta:
             return []
@@ -261,9 +219,10 @@ class MediaItems:
 
         self._logger.debug(f'Deleting media item "{media_item_meta["name"]}"')
 
-        if os.path.isfile(dest_file):
+        # remove directly instead of checking existence first (saves a stat per file)
+        try:
             os.remove(dest_file)
-        else:
+        except FileNotFoundError:
             self._logger.debug(f'Deletion for media item "{media_item_meta["name"]}" skipped. File not found')
 
     def _gen_path_by_cdate(self, date: str, date_format: str) -> str:
@@ -311,94 +270,190 @@ class MediaItems:
         return False
     
     def _add_item(self, media_item: dict) -> int:
+        return self._model.add_media_item_meta(**self._gen_item_meta(media_item))
+
+    def _gen_item_meta(self, media_item: dict) -> dict:
         cdate_format = self._detectDateFormat(media_item['mediaMetadata']['creationTime'])
         
         path = self._gen_path_by_cdate(media_item['mediaMetadata']['creationTime'], cdate_format)
         cname = self._get_canonicalized_name(media_item['filename'], path)
         create_date = datetime.strptime(media_item['mediaMetadata']['creationTime'], cdate_format).strftime('%Y-%m-%d %H:%M:%S')
-        index_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        index_date = format_now()
 
         self._logger.debug(f'Indexing media item "{media_item["filename"]}"')
 
-        return self._model.add_media_item_meta(
-            remote_id=media_item['id'],
-            name=media_item['filename'],
-            cname=cname,
-            mime_type=media_item['mimeType'],
-            create_date=create_date,
-            modify_date=create_date, # TODO: set mdate (if it will be available in API)
-            path=path,
-            index_date=index_date,
-            last_checked=index_date,
-            status='pending_sync',
-        )
+        return {
+            'remote_id': media_item['id'],
+            'name': media_item['filename'],
+            'cname': cname,
+            'mime_type': media_item['mimeType'],
+            'create_date': create_date,
+            'modify_date': create_date, # TODO: set mdate (if it will be available in API)
+            'path': path,
+            'index_date': index_date,
+            'last_checked': index_date,
+            'status': 'pending_sync',
+        }
+
+    async def _index_items(self, *, last_index: str = None, rescan: bool = False) -> ActionStats:
+        from_date = None
+        limit = self._media_items_list_limit
+        filters = {}
+        check_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        info = ActionStats(indexed=0, skipped=0, failed=0)
+
+        self._items_cnames.clear()
+
+        filters['mediaTypeFilter'] = {
+            'mediaTypes': ['ALL_MEDIA'],
+        }
+
+        if not rescan and last_index:
+            from_date = datetime.strptime(last_index, '%Y-%m-%d %H:%M:%S').strftime('%Y-%m-%d')
+
+        if from_date:
+            to_date = '9999-12-31'
+
+            filters['dateFilter'] = {
+                'ranges': [
+                    {
+                        'startDate': GPhotosApi.format_date(from_date),
+                        'endDate': GPhotosApi.format_date(to_date),
+                    }
+                ],
+            }
+
+            self._logger.info(f'Searching media items starting from {from_date}')
+
+        async for media_items in paginate(self._google_api.media_items_search, 'mediaItems', page_size=limit, filters=filters):
+            self._model.begin()
+
+            try:
+                (_, batch_info) = self._index_items_batch(media_items)
+
+                self._model.commit()
+            except Exception:
+                self._model.rollback()
+                raise
+
+            info.merge(batch_info)
+            batch_indexed = batch_info['indexed']
+
+            if batch_indexed:
+                self._logger.info(f'Media items batch index: indexed {batch_indexed}')
+
+        if rescan:
+            # mark all items older than check_date date as stale
+            stale_cnt = self._model.set_media_items_stale(last_checked=check_date)
+
+            if stale_cnt:
+                self._logger.info(f'Marked {stale_cnt} media items as stale')
+
+        return info
+
+    def _index_items_batch(self, media_items: list) -> tuple:
+        # fetch meta of all media items at once instead of querying each item
+        media_items_meta = self._model.get_media_items_meta_by_remote_ids([media_item['id'] for media_item in media_items])
+        info = ActionStats(indexed=0, skipped=0, failed=0)
+        up_to_date = []
+        to_add = []
+
+        for media_item in media_items:
+            media_item_meta = media_items_meta.get(media_item['id'])
+
+            if not self._index_needed(media_item_meta, media_item):
+                self._logger.debug(f'Index for media item "{media_item_meta["name"]}" skipped. Index not needed')
+
+                up_to_date.append(media_item_meta['media_id'])
+                info.increment(skipped=1)
+                continue
+
+            try:
+                to_add.append(self._gen_item_meta(media_item))
+            except Exception as e:
+                self._logger.error(f'Index for media item "{media_item["filename"]}" failed. {e}')
+                info.increment(failed=1)
+            else:
+                info.increment(indexed=1)
+
+        # insert all new / changed items of the page at once
+        self._model.add_media_items_meta_bulk(to_add)
+
+        last_checked = format_now()
+        self._model.update_media_items_last_checked(up_to_date, last_checked)
+
+        # retrieve meta of added items to get their ids
+        media_items_meta.update(self._model.get_media_items_meta_by_remote_ids([row['remote_id'] for row in to_add]))
+
+        return ({remote_id: meta['media_id'] for remote_id, meta in media_items_meta.items()}, info)
 
     async def _sync_items(self, *, concurrency: int = 1) -> ActionStats:
         limit = self._media_items_batch_limit
-        offset = 0
         total = self._model.get_media_items_meta_cnt(status=['pending_sync', 'sync_error'])
         info = ActionStats(synced=0, skipped=0, failed=0)
 
         if not total:
             return info
 
-        processed = 0
         t_start = datetime.now()
 
-        while True:
-            to_sync = await self._get_items_to_sync(limit=limit, offset=offset)
+        def save_results(results: list) -> None:
+            info.merge(self._save_items_sync_results(results))
 
-            if not to_sync:
-                break
+            # progress of completed items only
+            (percentage, eta) = gen_batch_stats(t_start, datetime.now(), info.total, total)
 
-            # break to_sync into chunks of concurrency length
-            chunks_to_sync = [to_sync[i:i + concurrency] for i in range(0, len(to_sync), concurrency)]
+            self._logger.info(f'Media items batch sync: {percentage}, eta: {eta}')
 
-            # sync items concurrently
-            for chunk in chunks_to_sync:
-                c_info = await self._sync_items_concurrently(chunk)
+        # concurrency workers pull items continuously, so a slow download doesn't hold back the others
+        await process_queued(self._iter_items_to_sync(limit), lambda item: self._sync_item(*item), save_results, concurrency=concurrency)
 
-                offset += c_info['failed']
-                info.increment(**dict(c_info))
+        return info
 
-            self._model.commit()
+    async def _iter_items_to_sync(self, limit: int):
+        last_id = 0
 
-            t_end = datetime.now()
-            processed += len(to_sync)
+        while True:
+            to_sync = await self._get_items_to_sync(limit=limit, after_id=last_id)
 
-            (percentage, eta) = gen_batch_stats(t_start, t_end, processed, total)
+            if not to_sync:
+                break
 
-            self._logger.info(f'Media items batch sync: {percentage}, eta: {eta}')
+            last_id = to_sync[-1][0]['media_id']
 
-        return info
+            yield to_sync
     
-    async def _sync_items_concurrently(self, to_sync: list) -> ActionStats:
-        tasks = []
+    def _save_items_sync_results(self, results: list) -> ActionStats:
         info = ActionStats(synced=0, skipped=0, failed=0)
+        updates = []
 
-        for (media_item_meta, media_item) in to_sync:
-            # sync media item
-            tasks.append(asyncio.create_task(self._sync_item(media_item_meta, media_item), name=media_item_meta['media_id']))
+        # update items status based on workers results
+        for ((media_item_meta, _), status, error) in results:
+            media_id = media_item_meta['media_id']
 
-        await asyncio.gather(*tasks, return_exceptions=True)
+            if error:
+                self._logger.error(f'Sync for media item #{media_id} failed. {error}')
+                updates.append({'media_id': media_id, 'status': 'sync_error'})
 
-        # update items status based on async tasks results
-        for t in tasks:
-            if t.exception():
-                self._logger.error(f'Sync for media item #{t.get_name()} failed. {t.exception()}')
-                self._model.update_media_item_meta(t.get_name(), status='sync_error')
-
-                info.increment(failed=1)
+                info.add('failed')
             else:
-                status = t.result()
                 status_upd = 'synced' if status in ['synced', 'skipped'] else status
 
-                self._model.update_media_item_meta(t.get_name(), status=status_upd)
+                updates.append({'media_id': media_id, 'status': status_upd})
 
                 if status == 'synced':
-                    info.increment(synced=1)
+                    info.add('synced')
                 else:
-                    info.increment(skipped=1)
+                    info.add('skipped')
+
+        self._model.begin()
+
+        try:
+            self._model.update_media_items_meta_bulk(updates)
+            self._model.commit()
+        except Exception:
+            self._model.rollback()
+            raise
 
         return info
 
@@ -452,8 +507,7 @@ class MediaItems:
         # download file
         await asyncio.to_thread(self._download_item, download_url, tmp_file)
 
-        if not os.path.isdir(dest_path):
-            os.makedirs(dest_path)
+        os.makedirs(dest_path, exist_ok=True)
 
         # move tmp file to dest file
         # Note: don't use os.rename() as it will fail if directory is on a different filesystem
@@ -469,7 +523,7 @@ class MediaItems:
 
     def _delete_obsolete_items_by_db(self) -> ActionStats:
         limit = 100
-        offset = 0
+        last_id = 0
         total = self._model.get_media_items_meta_cnt(status='stale')
         info = ActionStats(deleted=0, failed=0)
 
@@ -477,11 +531,13 @@ class MediaItems:
             return info
 
         while True:
-            to_delete = self._model.search_media_items_meta(limit=limit, offset=offset, status='stale')
+            to_delete = self._model.search_media_items_meta(limit=limit, after_id=last_id, status='stale')
 
             if not to_delete:
                 break
 
+            last_id = to_delete[-1]['media_id']
+
             for media_item_meta in to_delete:
                 try:
                     self._delete_item_file(media_item_meta)
@@ -489,7 +545,6 @@ class MediaItems:
                 except Exception as e:
                     self._logger.error(f'Deletion for media item "{media_item_meta["name"]}" failed. {e}')
 
-                    offset += 1
                     info.increment(failed=1)
                 else:
                     info.increment(deleted=1)
@@ -506,11 +561,12 @@ class MediaItems:
             if not files:
                 continue
 
-            for file in files:
-                relative_path = os.path.relpath(root, self._dest_path)
-                media_item_meta = self._model.search_media_items_meta(cname=file, path=relative_path)
+            relative_path = os.path.relpath(root, self._dest_path)
+            # fetch all indexed items of the directory at once instead of querying each file
+            media_items_cnames = self._model.get_media_items_cnames(path=relative_path)
 
-                if not media_item_meta:
+            for file in files:
+                if file not in media_items_cnames:
                     self._logger.debug(f'Media item "{file}" not found in database. Deleting')
 
                     try:
@@ -8,11 +8,27 @@ class MediaItemsModel:
 
         self._item_statuses: list = ['pending_sync', 'sync_error', 'synced', 'stale', 'ignored']
 
+        # statement executed for every indexed item. built once, so the same sql text
+        # is passed each time and the compiled statement is reused from the connection cache
+        self._add_media_item_query: str = '\n'.join((
+            "INSERT INTO media_items (remote_id, name, cname, mime_type, create_date, modify_date, path, index_date, last_checked, status)",
+            "VALUES (:remote_id, :name, :cname, :mime_type, :create_date, :modify_date, :path, :index_date, :last_checked, :status)",
+            "ON CONFLICT (remote_id) DO UPDATE",
+            "SET index_date=:index_date, last_checked=:last_checked, status=:status",
+        ))
+
         self._ensure_table()
+        self._ensure_indexes()
+
+    def begin(self) -> None:
+        self._storage.begin()
 
     def commit(self) -> None:
         self._storage.commit()
 
+    def rollback(self) -> None:
+        self._storage.rollback()
+
     def get_media_item_meta(self, *, media_id: int = None, remote_id: str = None) -> dict:
         if not media_id and not remote_id:
             raise ValueError('Missing media_id or remote_id')
@@ -34,14 +50,31 @@ class MediaItemsModel:
             "LIMIT 1",
         )
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             row = cursor.fetchone()
 
             if not row:
                 return {}
 
-            return dict(row)
+            return row
         
+    def get_media_items_meta_by_remote_ids(self, remote_ids: list) -> dict:
+        if not remote_ids:
+            return {}
+
+        placeholders = {}
+
+        query = (
+            "SELECT *",
+            "FROM media_items",
+            f"WHERE {self._storage.gen_in_condition('remote_id', remote_ids, placeholders)}",
+        )
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            rows = cursor.fetchall()
+
+            return {r['remote_id']: r for r in rows}
+
     def get_media_items_meta_cnt(self, *, status = None) -> int:
         placeholders = {}
         where = ['1=1']
@@ -55,7 +88,7 @@ class MediaItemsModel:
             f"WHERE {' AND '.join(where)}",
         )
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             row = cursor.fetchone()
 
             if not row:
@@ -71,7 +104,7 @@ class MediaItemsModel:
             "ORDER BY status ASC",
         )
 
-        with self._storage.execute(query) as cursor:
+        with self._storage.execute(query, commit=False) as cursor:
             rows = cursor.fetchall()
 
             if not rows:
@@ -79,10 +112,14 @@ class MediaItemsModel:
 
             return {r['status']: r['cnt'] for r in rows}
         
-    def search_media_items_meta(self, *, limit: int = 100, offset: int = 0, cname: str = None, path: str = None, status = None) -> list:
+    def search_media_items_meta(self, *, limit: int = 100, after_id: int = None, cname: str = None, path: str = None, status = None) -> list:
         placeholders = {}
         where = ['1=1']
 
+        if after_id:
+            where.append('media_id>:after_id')
+            placeholders['after_id'] = after_id
+
         if cname:
             where.append('cname=:cname')
             placeholders['cname'] = cname
@@ -99,20 +136,38 @@ class MediaItemsModel:
             "FROM media_items",
             f"WHERE {' AND '.join(where)}",
             "ORDER BY media_id ASC",
-            "LIMIT :limit OFFSET :offset",
+            "LIMIT :limit",
         )
 
         placeholders['limit'] = limit
-        placeholders['offset'] = offset
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
             rows = cursor.fetchall()
 
             if not rows:
                 return []
 
-            return [dict(r) for r in rows]
+            return rows
     
+    def get_media_items_cnames(self, *, path: str) -> set:
+        if not path:
+            raise ValueError('Missing path')
+
+        placeholders = {}
+
+        query = (
+            "SELECT cname",
+            "FROM media_items",
+            "WHERE path=:path",
+        )
+
+        placeholders['path'] = path
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            rows = cursor.fetchall()
+
+            return {r['cname'] for r in rows}
+
     def update_media_item_meta(self, media_id: int, **kwargs) -> int:
         if not media_id:
             raise ValueError('Missing media_id')
@@ -134,7 +189,6 @@ class MediaItemsModel:
             "UPDATE media_items",
             f"SET {update}",
             "WHERE media_id=:media_id",
-            "LIMIT 1",
         )
 
         placeholders['media_id'] = media_id
@@ -142,6 +196,53 @@ class MediaItemsModel:
         with self._storage.execute(query, placeholders, commit=False) as cursor:
             return cursor.rowcount
     
+    def update_media_items_meta_bulk(self, updates: list) -> int:
+        if not updates:
+            return 0
+
+        placeholders = {}
+        cases = []
+        ids = []
+
+        for i, update in enumerate(updates):
+            if not update.get('media_id'):
+                raise ValueError('Missing media_id')
+
+            if update.get('status') not in self._item_statuses:
+                raise ValueError(f'Invalid status "{update.get("status")}"')
+
+            cases.append(f'WHEN :case_id_{i} THEN :case_status_{i}')
+            placeholders[f'case_id_{i}'] = update['media_id']
+            ids.append(update['media_id'])
+            placeholders[f'case_status_{i}'] = update['status']
+
+        # update all items with a single statement
+        query = (
+            "UPDATE media_items",
+            f"SET status=CASE media_id {' '.join(cases)} END",
+            f"WHERE {self._storage.gen_in_condition('media_id', ids, placeholders)}",
+        )
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            return cursor.rowcount
+
+    def update_media_items_last_checked(self, media_ids: list, last_checked: str) -> int:
+        if not media_ids:
+            return 0
+
+        placeholders = {}
+
+        query = (
+            "UPDATE media_items",
+            "SET last_checked=:last_checked",
+            f"WHERE {self._storage.gen_in_condition('media_id', media_ids, placeholders)}",
+        )
+
+        placeholders['last_checked'] = last_checked
+
+        with self._storage.execute(query, placeholders, commit=False) as cursor:
+            return cursor.rowcount
+
     def set_media_items_stale(self, *, last_checked: str = None) -> int:
         placeholders = {}
         where = ['1=1']
@@ -203,13 +304,6 @@ class MediaItemsModel:
         if status and status not in self._item_statuses:
             raise ValueError(f'Invalid status "{status}"')
 
-        query = (
-            "INSERT INTO media_items (remote_id, name, cname, mime_type, create_date, modify_date, path, index_date, last_checked, status)",
-            "VALUES (:remote_id, :name, :cname, :mime_type, :create_date, :modify_date, :path, :index_date, :last_checked, :status)",
-            "ON CONFLICT (remote_id) DO UPDATE",
-            "SET index_date=:index_date, last_checked=:last_checked, status=:status",
-        )
-
         placeholders['remote_id'] = remote_id
         placeholders['name'] = name
         placeholders['cname'] = cname
@@ -221,9 +315,20 @@ class MediaItemsModel:
         placeholders['last_checked'] = last_checked
         placeholders['status'] = status
 
-        with self._storage.execute(query, placeholders) as cursor:
+        with self._storage.execute(self._add_media_item_query, placeholders, commit=False) as cursor:
             return cursor.lastrowid
     
+    def add_media_items_meta_bulk(self, rows: list) -> int:
+        if not rows:
+            return 0
+
+        for row in rows:
+            if row.get('status') and row['status'] not in self._item_statuses:
+                raise ValueError(f'Invalid status "{row["status"]}"')
+
+        with self._storage.executemany(self._add_media_item_query, rows, commit=False) as cursor:
+            return cursor.rowcount
+    
     def _ensure_table(self):
         query = (
             "CREATE TABLE IF NOT EXISTS media_items (",
@@ -243,4 +348,17 @@ class MediaItemsModel:
         )
         
         with self._storage.execute(query) as cursor:
-            pass
\ No newline at end of file
+            pass
+
+    def _ensure_indexes(self) -> None:
+        # remote_id is already covered by its unique constraint
+        queries = [
+            # paged searches by status (ordered by primary key)
+            "CREATE INDEX IF NOT EXISTS media_items_status_idx ON media_items (status, media_id)",
+            # taken cnames by path (covering, table rows are not read)
+            "CREATE INDEX IF NOT EXISTS media_items_path_cname_idx ON media_items (path, cname)",
+        ]
+
+        for query in queries:
+            with self._storage.execute(query):
+                pass
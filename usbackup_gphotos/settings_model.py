@@ -14,7 +14,7 @@ class SettingsModel:
             "FROM settings",
         )
 
-        with self._storage.execute(query) as cursor:
+        with self._storage.execute(query, commit=False) as cursor:
             rows = cursor.fetchall()
 
             if not rows:
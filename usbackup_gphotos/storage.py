@@ -2,18 +2,109 @@ import os
 import sqlite3
 from contextlib import contextmanager
 
+# prefer apsw (thin C wrapper over SQLite) if available, fallback to stdlib sqlite3
+try:
+    import apsw
+    _BACKEND = 'apsw'
+except ImportError:
+    apsw = None
+    _BACKEND = 'sqlite3'
+
+_WRITE_STATEMENTS = frozenset(['INSERT', 'UPDATE', 'DELETE', 'REPLACE'])
+
+class _ApswCursor:
+    # sqlite3 compatible cursor on top of an apsw connection
+    def __init__(self, conn) -> None:
+        self._conn = conn
+        self._cursor = conn.cursor()
+        self._cursor.row_trace = self._row_factory
+
+        self.rowcount: int = -1
+        self.lastrowid: int = None
+
+    def execute(self, query: str, params: dict = None) -> '_ApswCursor':
+        write = self._begin(query)
+
+        self._cursor.execute(query, params or {})
+
+        # same as sqlite3: rows changed by the statement itself (not by triggers or cascades), -1 for other statements
+        self.rowcount = self._conn.changes() if write else -1
+        self.lastrowid = self._conn.last_insert_rowid()
+
+        return self
+
+    def executemany(self, query: str, params: list) -> '_ApswCursor':
+        write = self._begin(query)
+
+        if write:
+            # changes() only covers the last execution, so sum it up for every parameters set (as sqlite3 does)
+            self.rowcount = 0
+
+            for p in params:
+                self._cursor.execute(query, p)
+                self.rowcount += self._conn.changes()
+        else:
+            self._cursor.executemany(query, params)
+            self.rowcount = -1
+
+        self.lastrowid = self._conn.last_insert_rowid()
+
+        return self
+
+    def fetchone(self) -> dict:
+        return self._cursor.fetchone()
+
+    def fetchall(self) -> list:
+        return self._cursor.fetchall()
+
+    def close(self) -> None:
+        self._cursor.close()
+
+    def _begin(self, query: str) -> bool:
+        # apsw runs in autocommit mode, so open a transaction before writes (same as sqlite3 does)
+        write = query.lstrip().split(None, 1)[0].upper() in _WRITE_STATEMENTS
+
+        if write and self._conn.get_autocommit():
+            self._conn.cursor().execute('BEGIN')
+
+        return write
+
+    @staticmethod
+    def _row_factory(cursor, row: tuple) -> dict:
+        return dict(zip([d[0] for d in cursor.get_description()], row))
+
 class Storage:
-    def __init__(self, db_file: str) -> None:
+    def __init__(self, db_file: str, *, backend: str = None) -> None:
         if not db_file:
             raise ValueError('db_file must be specified')
+
+        self._backend: str = backend or _BACKEND
+
+        if self._backend not in ['apsw', 'sqlite3'] or (self._backend == 'apsw' and apsw is None):
+            raise ValueError(f'Backend "{self._backend}" is not available')
         
         db_path = os.path.dirname(db_file)
 
-        if not os.path.isdir(db_path):
+        # no directory for in memory databases (":memory:")
+        if db_path and not os.path.isdir(db_path):
             os.makedirs(db_path)
 
-        self._conn: sqlite3.Connection = sqlite3.connect(db_file, check_same_thread=False)
-        self._conn.row_factory = sqlite3.Row
+        # keep compiled statements around, so hot queries (with the same sql text) are prepared only once.
+        # queries with generated IN conditions have distinct texts, so make room for them too
+        statements_cache_size = 512
+
+        if self._backend == 'apsw':
+            self._conn = apsw.Connection(db_file, statementcachesize=statements_cache_size)
+            self._conn.set_busy_timeout(5000)
+        else:
+            self._conn = sqlite3.connect(db_file, check_same_thread=False, cached_statements=statements_cache_size)
+            # build plain dicts directly (same as the apsw cursor), so models don't copy sqlite3.Row objects into dicts
+            self._conn.row_factory = self._row_factory
+
+        # WAL + synchronous=NORMAL only syncs on checkpoints instead of on every commit
+        for pragma in ['journal_mode=WAL', 'synchronous=NORMAL', 'temp_store=MEMORY', 'cache_size=-65536']:
+            with self.execute(f'PRAGMA {pragma}', commit=False) as cursor:
+                cursor.fetchall()
 
     @contextmanager
     def execute(self, query, params: dict = None, *, commit: bool = True):
@@ -32,17 +123,77 @@ class Storage:
         # print(query_debug)
         
         try:
-            cursor = self._conn.cursor()
+            cursor = _ApswCursor(self._conn) if self._backend == 'apsw' else self._conn.cursor()
             cursor.execute(query, params or {})
             yield cursor
         finally:
             if commit:
-                self._conn.commit()
+                self.commit()
 
             cursor.close()
 
+    @contextmanager
+    def executemany(self, query, params: list, *, commit: bool = True):
+        if not query:
+            raise ValueError('query must be specified')
+
+        if isinstance(query, tuple):
+            query = '\n'.join(query)
+
+        try:
+            cursor = _ApswCursor(self._conn) if self._backend == 'apsw' else self._conn.cursor()
+            cursor.executemany(query, params)
+            yield cursor
+        finally:
+            if commit:
+                self.commit()
+
+            cursor.close()
+
+    def begin(self) -> None:
+        # start a transaction explicitly (no-op if one is already open)
+        if self._backend == 'apsw':
+            if self._conn.get_autocommit():
+                self._conn.cursor().execute('BEGIN')
+        elif not self._conn.in_transaction:
+            self._conn.execute('BEGIN')
+
     def commit(self) -> None:
-        self._conn.commit()
+        if self._backend == 'apsw':
+            if not self._conn.get_autocommit():
+                self._conn.cursor().execute('COMMIT')
+        else:
+            self._conn.commit()
+
+    def rollback(self) -> None:
+        if self._backend == 'apsw':
+            if not self._conn.get_autocommit():
+                self._conn.cursor().execute('ROLLBACK')
+        else:
+            self._conn.rollback()
+
+    @contextmanager
+    def savepoint(self, name: str):
+        # writes made inside are undone on error, without discarding the rest of the open transaction
+        cursor = _ApswCursor(self._conn) if self._backend == 'apsw' else self._conn.cursor()
+
+        try:
+            cursor.execute(f'SAVEPOINT {name}')
+
+            try:
+                yield
+            except BaseException:
+                cursor.execute(f'ROLLBACK TO {name}')
+                cursor.execute(f'RELEASE {name}')
+                raise
+
+            cursor.execute(f'RELEASE {name}')
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _row_factory(cursor, row: tuple) -> dict:
+        return dict(zip([d[0] for d in cursor.description], row))
 
     def gen_in_condition(self, field: str, data, placeholders: dict) -> str:
         if not field or not data:
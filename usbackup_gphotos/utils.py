@@ -1,5 +1,7 @@
 import re
-from datetime import timedelta
+import time
+import asyncio
+from datetime import datetime, timedelta
 
 __all__ = ['transform_fs_safe']
 
@@ -20,16 +22,110 @@ def transform_fs_safe(file_name: str) -> str:
 
     return file_name
 
+# last formatted timestamp as (second, formatted value)
+_now_formatted: tuple = (0, '')
+
+def format_now() -> str:
+    # same as datetime.now().strftime('%Y-%m-%d %H:%M:%S'), but formats only once per second (called for every indexed item)
+    global _now_formatted
+
+    ts = int(time.time())
+
+    if _now_formatted[0] != ts:
+        _now_formatted = (ts, datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S'))
+
+    return _now_formatted[1]
+
 def gen_batch_stats(t_start: float, t_end: float, processed: int, total: int) -> tuple:
-    # calc percentage completed, add % sign
-    percentage = round(processed / total * 100, 2) if total > 0 else 0
-    # format percentage
-    percentage_str = f'{percentage}%'
+    (percentage, eta) = _calc_batch_stats((t_end - t_start).total_seconds(), processed, total)
 
-    # calc estimated time left
-    elapsed = (t_end - t_start).total_seconds()
-    eta = int(round((elapsed / processed) * (total - processed), 2))
+    # format percentage, add % sign
+    percentage_str = f'{percentage}%'
     # format eta
     eta_str = str(timedelta(seconds=eta))
 
-    return (percentage_str, eta_str)
\ No newline at end of file
+    return (percentage_str, eta_str)
+
+def _calc_batch_stats(elapsed: float, processed: int, total: int) -> tuple:
+    # calc percentage completed
+    percentage = round(processed / total * 100, 2) if total > 0 else 0
+
+    # calc estimated time left
+    eta = int(round((elapsed / processed) * (total - processed), 2)) if processed > 0 else 0
+
+    return (percentage, eta)
+
+async def paginate(fetch_fn, key: str, **kwargs):
+    # yield results of api list calls page by page. next page is fetched in background while current one is processed
+    next_page = asyncio.create_task(asyncio.to_thread(fetch_fn, page_token=None, **kwargs))
+
+    try:
+        while True:
+            page = await next_page
+
+            if not page:
+                break
+
+            page_token = page.get('nextPageToken')
+
+            if page_token:
+                next_page = asyncio.create_task(asyncio.to_thread(fetch_fn, page_token=page_token, **kwargs))
+
+            yield page.get(key, [])
+
+            if not page_token:
+                break
+    finally:
+        # consumer stopped early
+        if not next_page.done():
+            next_page.cancel()
+
+async def process_queued(pages, process_fn, save_fn, *, concurrency: int = 1) -> None:
+    # process items of all pages with concurrency workers. workers keep running across pages, so none of them waits
+    # for a page to finish before the next one is queued. save_fn gets the (item, status, error) results completed so far
+    # after every page, and the remaining ones once processing ends (on errors and interruptions too)
+    # the queue holds at most concurrency items, so a page is queued only when all but its last few items are taken
+    queue = asyncio.Queue(maxsize=concurrency)
+    results = []
+
+    async def worker() -> None:
+        while True:
+            item = await queue.get()
+
+            try:
+                status = await process_fn(item)
+            except Exception as e:
+                results.append((item, None, e))
+            else:
+                results.append((item, status, None))
+            finally:
+                queue.task_done()
+
+    def save() -> None:
+        if not results:
+            return
+
+        # take the results collected by workers so far
+        to_save = results[:]
+        results.clear()
+
+        save_fn(to_save)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+
+    try:
+        async for page in pages:
+            for item in page:
+                await queue.put(item)
+
+            save()
+
+        await queue.join()
+    finally:
+        for worker_task in workers:
+            worker_task.cancel()
+
+        await asyncio.gather(*workers, return_exceptions=True)
+
+        # cancelled workers add no results, so everything completed until now is saved
+        save()